@@ -0,0 +1,111 @@
+import subprocess
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Обработка звука для /slow_voice. Модуль импортируется только в процессах
+# пула, поэтому numpy не загружается при запуске бота.
+
+SAMPLE_RATE = 24000
+N_FFT = 1024
+HOP = 256
+BLOCK_FRAMES = 256
+
+
+def _overlap_add(out: np.ndarray, frames: np.ndarray, start: int, hop: int):
+    """Складывает кадры с шагом hop, начиная с позиции start.
+
+    Длина кадра кратна hop, поэтому сложение делается n_fft // hop
+    векторными операциями вместо цикла по кадрам.
+    """
+    count, n_fft = frames.shape
+    for j in range(n_fft // hop):
+        part = frames[:, j * hop : (j + 1) * hop].reshape(-1)
+        begin = start + j * hop
+        out[begin : begin + count * hop] += part
+
+
+def time_stretch(
+    samples: np.ndarray,
+    rate: float,
+    n_fft: int = N_FFT,
+    hop: int = HOP,
+    block_frames: int = BLOCK_FRAMES,
+) -> np.ndarray:
+    """Меняет темп без изменения высоты тона (фазовый вокодер).
+
+    rate < 1 замедляет. Спектр считается блоками по block_frames кадров,
+    чтобы память не росла с длиной записи; фаза переносится между блоками.
+    """
+    samples = samples.astype(np.float32)
+    window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+    pad = n_fft // 2
+    padded = np.pad(samples, (pad, pad + n_fft))
+    frames_view = sliding_window_view(padded, n_fft)[::hop]
+
+    steps = np.arange(0, len(frames_view) - 1, rate)
+    out = np.zeros(len(steps) * hop + n_fft, dtype=np.float32)
+    # Ожидаемый набег фазы каждой частоты за один шаг
+    phase_advance = 2 * np.pi * hop * np.arange(n_fft // 2 + 1) / n_fft
+    phase = None
+    norm = np.zeros_like(out)
+    window_sq = np.tile(window**2, (block_frames, 1))
+
+    for start in range(0, len(steps), block_frames):
+        block = steps[start : start + block_frames]
+        idx = block.astype(np.int64)
+        alpha = (block - idx)[:, None]
+        first = idx[0]
+        spectrum = np.fft.rfft(frames_view[first : idx[-1] + 2] * window, axis=1)
+        left = spectrum[idx - first]
+        right = spectrum[idx - first + 1]
+
+        magnitude = (1 - alpha) * np.abs(left) + alpha * np.abs(right)
+        delta = np.angle(right) - np.angle(left) - phase_advance
+        delta -= 2 * np.pi * np.round(delta / (2 * np.pi))
+        delta += phase_advance
+
+        if phase is None:
+            phase = np.angle(left[0])
+        accumulated = np.cumsum(delta, axis=0)
+        frame_phase = np.vstack([phase[None, :], phase + accumulated[:-1]])
+        phase = phase + accumulated[-1]
+
+        frames = np.fft.irfft(magnitude * np.exp(1j * frame_phase), n=n_fft, axis=1)
+        _overlap_add(out, (frames * window).astype(np.float32), start * hop, hop)
+        # Сумма квадратов окна в каждой точке — для нормировки громкости
+        _overlap_add(norm, window_sq[: len(block)], start * hop, hop)
+
+    out /= np.maximum(norm, 1e-3)
+    return out[pad : pad + int(len(samples) / rate)]
+
+
+def decode(data: bytes, max_duration: float) -> np.ndarray:
+    """Голосовое/аудио любого формата → моно PCM float32 через ffmpeg.
+
+    Декодируется не больше max_duration + 1 сек: этого достаточно, чтобы
+    отказать слишком длинному аудио.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", "pipe:0"]
+        + ["-t", str(max_duration + 1)]
+        + ["-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        input=data,
+        capture_output=True,
+        check=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768
+
+
+def encode(samples: np.ndarray) -> bytes:
+    """PCM float32 → OGG/Opus для голосового сообщения"""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+    result = subprocess.run(
+        ["ffmpeg", "-loglevel", "error"]
+        + ["-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-i", "pipe:0"]
+        + ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg", "pipe:1"],
+        input=pcm.tobytes(),
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
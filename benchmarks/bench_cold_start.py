@@ -0,0 +1,211 @@
+"""Холодный старт: время до первого ответа по статистике чата.
+
+Для каждого размера чата и формата снапшота (json, binary) запускается чистый
+процесс python, и замеряется время от его запуска родителем до первого
+лидерборда: старт интерпретатора, импорт statistics_data, загрузка снапшота,
+доигрывание журнала. Отдельно — время самого импорта внутри процесса. Если
+установлен python-telegram-bot, дополнительно замеряется время от запуска
+бота против fake_bot_api до ответа на /stats, выданный сразу при старте,
+и проверяется, что edge_tts и numpy не загружаются при импорте бота.
+
+Запуск:
+    python benchmarks/bench_cold_start.py
+    python benchmarks/bench_cold_start.py --sizes 10000 --repeat 5 -o cold.json
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stats_json
+from bench_stats import CHAT_ID, make_dataset, write_dataset
+
+DEFAULT_SIZES = "10000,1000000"
+FORMATS = ("json", "binary")
+
+# Код дочернего процесса. BENCH_LAUNCHED — время time.time() перед запуском
+# процесса родителем: first_read_s включает старт интерпретатора
+FIRST_READ = """
+import json, os, sys, time
+started = time.perf_counter()
+import statistics_data
+imported = time.perf_counter()
+statistics_data.get_mvp_leaderboard({chat_id})
+loaded = time.time()
+print(json.dumps({{
+    "import_s": imported - started,
+    "first_read_s": loaded - float(os.environ["BENCH_LAUNCHED"]),
+    "edge_tts": "edge_tts" in sys.modules,
+    "numpy": "numpy" in sys.modules,
+}}))
+"""
+
+BOT_IMPORT = """
+import json, os, sys, time
+import group_bot
+print(json.dumps({
+    "bot_import_s": time.time() - float(os.environ["BENCH_LAUNCHED"]),
+    "edge_tts": "edge_tts" in sys.modules,
+    "numpy": "numpy" in sys.modules,
+}))
+"""
+
+
+def prepare(workdir: str, players: int, snapshot_format: str) -> int:
+    """Снапшот чата в нужном формате; возвращает его размер в байтах"""
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        write_dataset("json", CHAT_ID, make_dataset(players))
+        # Загрузка переписывает снапшот в формат STATS_SNAPSHOT_FORMAT
+        stats_json.SNAPSHOT_FORMAT = snapshot_format
+        shard = stats_json.ChatStats(str(CHAT_ID))
+        shard.load()
+        shard.journal.close()
+        if snapshot_format == "json":
+            return os.path.getsize(shard.stats_file)
+        return os.path.getsize(shard.snapshot_file)
+    finally:
+        os.chdir(cwd)
+
+
+def child_env(snapshot_format: str) -> dict:
+    return dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        STATS_BACKEND="json",
+        STATS_SNAPSHOT_FORMAT=snapshot_format,
+        METRICS_PORT="0",
+    )
+
+
+def run_child(code: str, workdir: str, snapshot_format: str) -> dict:
+    env = child_env(snapshot_format)
+    started = time.perf_counter()
+    env["BENCH_LAUNCHED"] = repr(time.time())
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    row = json.loads(result.stdout.strip().splitlines()[-1])
+    # Вместе с запуском интерпретатора и завершением процесса
+    row["process_s"] = time.perf_counter() - started
+    return row
+
+
+def first_stats_reply(workdir: str, snapshot_format: str) -> float:
+    """От запуска бота до ответа на /stats, ожидавший в очереди обновлений"""
+    from bench_polling_vs_webhook import start_bot
+    from fake_bot_api import FakeBotApi
+
+    api = FakeBotApi()
+    api.start()
+    try:
+        api.push_update(api.message_update(CHAT_ID, "/stats"))
+        started = time.monotonic()
+        bot = start_bot(
+            api,
+            "polling",
+            workdir,
+            extra_env={"STATS_SNAPSHOT_FORMAT": snapshot_format},
+        )
+        try:
+            call = api.wait_for_call(
+                "sendMessage", lambda p: p.get("chat_id") == CHAT_ID, timeout=300
+            )
+            if call is None:
+                raise RuntimeError("бот не ответил на /stats")
+            return call[0] - started
+        finally:
+            bot.send_signal(signal.SIGINT)
+            bot.wait(timeout=60)
+    finally:
+        api.stop()
+
+
+def best(rows: list) -> dict:
+    """Лучший из повторов по каждому полю: меньше всего шума от системы"""
+    return {
+        key: min(row[key] for row in rows) if key.endswith("_s") else rows[0][key]
+        for key in rows[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default=DEFAULT_SIZES, help="числа игроков через запятую"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="результаты в JSON")
+    args = parser.parse_args()
+
+    try:
+        import telegram  # noqa: F401
+
+        with_bot = True
+    except ImportError as e:
+        print(f"Замер бота пропущен: {e}")
+        with_bot = False
+
+    results = {}
+    if with_bot:
+        with tempfile.TemporaryDirectory() as workdir:
+            results["bot_import"] = best(
+                [run_child(BOT_IMPORT, workdir, "binary") for _ in range(args.repeat)]
+            )
+        row = results["bot_import"]
+        print(
+            f"запуск и импорт group_bot {row['bot_import_s'] * 1000:8.1f} мс, "
+            f"edge_tts {'загружен' if row['edge_tts'] else 'нет'}, "
+            f"numpy {'загружен' if row['numpy'] else 'нет'}"
+        )
+
+    for players in (int(size) for size in args.sizes.split(",")):
+        for snapshot_format in FORMATS:
+            with tempfile.TemporaryDirectory() as workdir:
+                size = prepare(workdir, players, snapshot_format)
+                code = FIRST_READ.format(chat_id=CHAT_ID)
+                row = best(
+                    [
+                        run_child(code, workdir, snapshot_format)
+                        for _ in range(args.repeat)
+                    ]
+                )
+                row["snapshot_bytes"] = size
+                if with_bot:
+                    row["first_update_s"] = min(
+                        first_stats_reply(workdir, snapshot_format)
+                        for _ in range(args.repeat)
+                    )
+            results[f"{snapshot_format}/{players}"] = row
+            line = (
+                f"{snapshot_format:>6} {players:>8} игроков: "
+                f"снапшот {size / 2**20:7.1f} МБ, "
+                f"импорт {row['import_s'] * 1000:6.1f} мс, "
+                f"первый топ от запуска {row['first_read_s'] * 1000:8.1f} мс"
+            )
+            if with_bot:
+                line += f", первый /stats {row['first_update_s'] * 1000:8.1f} мс"
+            print(line)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
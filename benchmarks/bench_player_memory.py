@@ -0,0 +1,69 @@
+"""Память на одного игрока: словари с ISO-строками против PlayerRecord.
+
+Запуск: python benchmarks/bench_player_memory.py [число игроков, по умолчанию 1000000]
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_json import ChatStats, PlayerRecord
+
+
+def legacy_players(players: int) -> dict:
+    # Прежний формат player_stats
+    return {
+        f"user_{i}": {
+            "mvp_count": 0,
+            "lvp_count": 0,
+            "username": f"@Player{i}",
+            "first_seen": datetime.now().isoformat(),
+        }
+        for i in range(1, players + 1)
+    }
+
+
+def compact_players(players: int) -> dict:
+    now = int(time.time())
+    return {
+        f"user_{i}": PlayerRecord(f"@Player{i}", first_seen=now)
+        for i in range(1, players + 1)
+    }
+
+
+def full_shard(players: int) -> ChatStats:
+    # Вместе с индексом ников и лидербордами, как в работающем боте
+    shard = ChatStats("bench")
+    for i in range(1, players + 1):
+        shard.register_player(f"user_{i}", f"@Player{i}")
+    return shard
+
+
+def traced_bytes(build, players: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    data = build(players)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return size
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    before = traced_bytes(legacy_players, players)
+    after = traced_bytes(compact_players, players)
+    shard = traced_bytes(full_shard, players)
+    print(f"{players} игроков")
+    print(f"  словари (было):     {before / players:7.1f} байт/игрок")
+    print(f"  PlayerRecord:       {after / players:7.1f} байт/игрок")
+    print(f"  чат целиком:        {shard / players:7.1f} байт/игрок (с индексом ников)")
+    print(f"  экономия player_stats: {1 - after / before:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Сквозная задержка обновлений: long polling против вебхука.
+
+Бот запускается отдельным процессом против локального fake_bot_api.
+Для каждого режима по одному отправляются обновления /help и замеряется
+время от выдачи обновления до вызова sendMessage с ответом.
+
+Запуск: python benchmarks/bench_polling_vs_webhook.py [число обновлений]
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi
+
+CHAT_ID = -1001
+WEBHOOK_SECRET = "bench-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_bot(
+    api: FakeBotApi, mode: str, workdir: str, args=None, extra_env=None
+) -> subprocess.Popen:
+    """Запускает бота против api; args — команда вместо group_bot.py"""
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        TELEGRAM_TOKEN="123:bench",
+        TELEGRAM_API_URL=api.url,
+        BOT_MODE=mode,
+    )
+    if mode == "webhook":
+        port = free_port()
+        env.update(
+            WEBHOOK_LISTEN="127.0.0.1",
+            WEBHOOK_PORT=str(port),
+            WEBHOOK_PATH="hook",
+            WEBHOOK_URL=f"http://127.0.0.1:{port}/hook",
+            WEBHOOK_SECRET=WEBHOOK_SECRET,
+        )
+    env.update(extra_env or {})
+    # Рабочий каталог временный: статистика и кэши бота не попадают в репозиторий
+    args = args or [os.path.join(ROOT, "group_bot.py")]
+    return subprocess.Popen([sys.executable] + args, cwd=workdir, env=env)
+
+
+def wait_ready(api: FakeBotApi, mode: str, timeout: float = 30) -> bool:
+    if mode == "polling":
+        return api.polling_started.wait(timeout)
+    if api.wait_for_call("setWebhook", timeout=timeout) is None:
+        return False
+    # setWebhook вызывается до запуска HTTP-сервера, даём ему подняться
+    time.sleep(0.5)
+    return True
+
+
+def measure(api: FakeBotApi, count: int) -> list:
+    latencies = []
+    for i in range(count):
+        since = len(api.calls)
+        started = time.monotonic()
+        api.push_update(api.message_update(CHAT_ID, "/help", user_id=i + 1))
+        call = api.wait_for_call(
+            "sendMessage", lambda p: p.get("chat_id") == CHAT_ID, since=since
+        )
+        if call is None:
+            raise RuntimeError("бот не ответил на /help")
+        latencies.append(call[0] - started)
+    return latencies
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    api = FakeBotApi()
+    api.start()
+    try:
+        for mode in ("polling", "webhook"):
+            with tempfile.TemporaryDirectory() as workdir:
+                bot = start_bot(api, mode, workdir)
+                try:
+                    if not wait_ready(api, mode):
+                        raise RuntimeError(f"бот не запустился в режиме {mode}")
+                    # Разогрев: первые ответы открывают соединения пула
+                    measure(api, 5)
+                    latencies = measure(api, count)
+                finally:
+                    bot.send_signal(signal.SIGINT)
+                    bot.wait(timeout=30)
+                    api.webhook_url = None
+                    api.polling_started.clear()
+                    api.reset()
+            print(
+                f"{mode:>8}: {count} обновлений, "
+                f"p50 {percentile(latencies, 0.5) * 1000:6.2f} мс, "
+                f"p99 {percentile(latencies, 0.99) * 1000:6.2f} мс, "
+                f"webhook_errors {api.webhook_errors}"
+            )
+    finally:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
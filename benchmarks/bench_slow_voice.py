@@ -0,0 +1,42 @@
+"""Производительность замедления голоса: секунды аудио на секунду CPU.
+
+Запуск: python benchmarks/bench_slow_voice.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_stretch import SAMPLE_RATE, time_stretch
+from slow_voice import SLOW_VOICE_RATE
+
+
+def synthetic_voice(seconds: float) -> np.ndarray:
+    """Похожий на речь сигнал: гармоники с плавающей частотой и шум"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    signal = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    noise = np.random.default_rng(0).normal(0, 0.02, len(t))
+    return (0.3 * signal * envelope + noise).astype(np.float32)
+
+
+def main():
+    for seconds in (5, 30, 120):
+        samples = synthetic_voice(seconds)
+        started = time.process_time()
+        stretched = time_stretch(samples, SLOW_VOICE_RATE)
+        cpu = time.process_time() - started
+        print(
+            f"{seconds:>4} сек аудио: {cpu:6.3f} сек CPU, "
+            f"{seconds / cpu:7.1f} сек аудио/сек CPU, "
+            f"результат {len(stretched) / SAMPLE_RATE:.1f} сек"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Микробенчмарки статистики и обработчиков на синтетических чатах.
+
+Для каждого размера чата (число игроков) замеряются загрузка и сохранение,
+запись наград, чтение лидербордов, поиск по нику, рендер /stats, пиковая
+память загрузки и обработчики бота с поддельными Update/Context — без сети.
+
+Результаты пишутся в JSON с отсортированными ключами, чтобы файлы
+разных коммитов можно было сравнивать diff-ом.
+
+Запуск:
+    python benchmarks/bench_stats.py
+    python benchmarks/bench_stats.py --sizes 100,1000000 --backend sqlite -o after.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import statistics_data
+from stats_persistence import atomic_write_json
+
+CHAT_ID = -100500
+DEFAULT_SIZES = "100,1000,10000,100000"
+
+
+def make_dataset(players: int, seed: int = 0) -> dict:
+    """Снапшот чата с players игроками и правдоподобным распределением наград"""
+    rng = random.Random(seed)
+    player_stats = {}
+    for i in range(1, players + 1):
+        player_stats[f"user_{i}"] = {
+            "mvp_count": int(rng.paretovariate(1.5)) - 1,
+            "lvp_count": int(rng.paretovariate(1.5)) - 1,
+            "username": f"@Player{i}",
+            "first_seen": "2024-01-01T00:00:00",
+        }
+    games = players * 3
+    wins = rng.randint(0, games)
+    return {
+        "lobby_stats": {"total_games": games, "wins": wins, "losses": games - wins},
+        "player_stats": player_stats,
+        "journal_offset": 0,
+        "next_player_num": players + 1,
+    }
+
+
+def write_dataset(backend: str, chat_id: int, data: dict):
+    if backend == "sqlite":
+        from stats_sqlite import SqliteStatsBackend
+
+        db = SqliteStatsBackend()
+        db.import_chat(str(chat_id), data)
+        db.close()
+    else:
+        os.makedirs("stats", exist_ok=True)
+        atomic_write_json(os.path.join("stats", f"{chat_id}.json"), data)
+
+
+def measure(func, number: int) -> float:
+    """Среднее время одного вызова, сек"""
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - started) / number
+
+
+class FakeMessage:
+    """Сообщение, на которое бот отвечает: ответы копятся в памяти"""
+
+    def __init__(self, chat_id: int, user_id: int):
+        self.chat_id = chat_id
+        self.from_user = SimpleNamespace(id=user_id, username=f"user{user_id}")
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(chat_id: int, user_id: int = 1) -> SimpleNamespace:
+    message = FakeMessage(chat_id, user_id)
+    return SimpleNamespace(
+        update_id=0,
+        message=message,
+        callback_query=None,
+        effective_chat=SimpleNamespace(id=chat_id, type="group"),
+        effective_user=message.from_user,
+    )
+
+
+def fake_context(args=None) -> SimpleNamespace:
+    return SimpleNamespace(args=args or [], bot=None)
+
+
+async def bench_handlers(group_bot, players: int, number: int) -> dict:
+    rng = random.Random(1)
+
+    async def timed(handler, args_factory):
+        started = time.perf_counter()
+        for _ in range(number):
+            await handler(fake_update(CHAT_ID), fake_context(args_factory()))
+        return (time.perf_counter() - started) / number
+
+    results = {
+        "handler_win_s": await timed(group_bot.win_command, list),
+        "handler_mvp_s": await timed(
+            group_bot.mvp_command,
+            lambda: [f"@Player{rng.randint(1, players)}"],
+        ),
+    }
+    # Первый /stats после изменения перерисовывает текст, повторные — из кэша
+    group_bot.stats_render_cache.invalidate(CHAT_ID)
+    results["handler_stats_cold_s"] = await timed(
+        lambda update, context: _stats_after_change(group_bot, update, context), list
+    )
+    results["handler_stats_cached_s"] = await timed(group_bot.show_stats, list)
+    return results
+
+
+async def _stats_after_change(group_bot, update, context):
+    # Меняем версию чата без записи, чтобы каждый /stats рендерился заново
+    statistics_data._bump_version(str(CHAT_ID))
+    await group_bot.show_stats(update, context)
+
+
+def bench_size(backend: str, players: int, group_bot) -> dict:
+    ops = 2000
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            data = make_dataset(players)
+            write_dataset(backend, CHAT_ID, data)
+            del data
+            gc.collect()
+
+            statistics_data.STATS_BACKEND = backend
+            if backend == "json":
+                # Первая загрузка переводит JSON в формат STATS_SNAPSHOT_FORMAT,
+                # замеряется обычная загрузка
+                statistics_data.load_stats(CHAT_ID)
+                statistics_data.close_stats()
+            started = time.perf_counter()
+            statistics_data.load_stats(CHAT_ID)
+            results["load_s"] = time.perf_counter() - started
+
+            rng = random.Random(2)
+            usernames = [f"@player{rng.randint(1, players)}" for _ in range(ops)]
+            names = iter(usernames)
+            results["add_mvp_s"] = measure(
+                lambda: statistics_data.add_mvp(CHAT_ID, next(names)), ops
+            )
+            names = iter(usernames)
+            results["find_player_s"] = measure(
+                lambda: statistics_data.find_player_by_username(CHAT_ID, next(names)),
+                ops,
+            )
+            results["leaderboard_top10_s"] = measure(
+                lambda: statistics_data.get_mvp_leaderboard(CHAT_ID), ops
+            )
+            results["leaderboard_deep_page_s"] = measure(
+                lambda: statistics_data.get_lvp_leaderboard(
+                    CHAT_ID, offset=players // 2, limit=10
+                ),
+                ops,
+            )
+
+            started = time.perf_counter()
+            statistics_data.save_stats()
+            results["save_s"] = time.perf_counter() - started
+            backend_obj = statistics_data.get_backend()
+            if hasattr(backend_obj, "compact"):
+                # Полная перезапись снапшота чата
+                started = time.perf_counter()
+                backend_obj.compact()
+                results["compact_s"] = time.perf_counter() - started
+
+            if group_bot is not None:
+                results["render_stats_s"] = measure(
+                    lambda: group_bot.render_stats(CHAT_ID), min(ops, 1000)
+                )
+                results.update(
+                    asyncio.run(bench_handlers(group_bot, players, min(ops, 1000)))
+                )
+            statistics_data.close_stats()
+
+            # Пиковая память загрузки — отдельным проходом: tracemalloc
+            # замедляет выполнение и исказил бы остальные замеры
+            gc.collect()
+            tracemalloc.start()
+            statistics_data.load_stats(CHAT_ID)
+            results["load_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            statistics_data.close_stats()
+        finally:
+            statistics_data.close_stats()
+            os.chdir(cwd)
+
+    results["ops"] = ops
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default=DEFAULT_SIZES, help="числа игроков через запятую"
+    )
+    parser.add_argument("--backend", choices=("json", "sqlite", "all"), default="all")
+    parser.add_argument("-o", "--output", default="bench_stats.json")
+    args = parser.parse_args()
+
+    try:
+        import group_bot
+    except ImportError as e:
+        # Без зависимостей бота замеряется только слой статистики
+        print(f"Обработчики пропущены: {e}")
+        group_bot = None
+
+    backends = ("json", "sqlite") if args.backend == "all" else (args.backend,)
+    results = {}
+    for backend in backends:
+        for players in (int(size) for size in args.sizes.split(",")):
+            row = bench_size(backend, players, group_bot)
+            results[f"{backend}/{players}"] = row
+            print(
+                f"{backend:>6} {players:>8} игроков: "
+                f"загрузка {row['load_s'] * 1000:8.1f} мс, "
+                f"mvp {row['add_mvp_s'] * 1e6:7.1f} мкс, "
+                f"топ-10 {row['leaderboard_top10_s'] * 1e6:7.1f} мкс, "
+                f"сохранение {row['save_s'] * 1000:8.1f} мс, "
+                f"память {row['load_peak_bytes'] / 2**20:7.1f} МБ"
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Результаты: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
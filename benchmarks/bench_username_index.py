@@ -0,0 +1,46 @@
+"""Сравнение поиска игрока по нику: индекс против линейного прохода.
+
+Запуск: python benchmarks/bench_username_index.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_json import ChatStats
+
+
+def linear_scan(player_stats, username: str) -> str:
+    # Прежняя реализация find_player_by_username
+    username = username.lower().strip("@")
+    for user_id, data in player_stats.items():
+        if (data.username or "").lower().strip("@") == username:
+            return user_id
+    return None
+
+
+def main():
+    for players in (100, 1_000, 10_000, 50_000):
+        shard = ChatStats("bench")
+        for i in range(players):
+            shard.register_player(shard.new_player_id(), f"@Player{i}")
+        # Худший случай для прохода — последний зарегистрированный игрок
+        target = f"@PLAYER{players - 1}"
+        assert shard.find_player_by_username(target) == linear_scan(
+            shard.player_stats, target
+        )
+
+        number = max(10, 200_000 // players)
+        scan = timeit.timeit(
+            lambda: linear_scan(shard.player_stats, target), number=number
+        )
+        index = timeit.timeit(lambda: shard.find_player_by_username(target), number=number)
+        print(
+            f"{players:>7} игроков: проход {scan / number * 1e6:10.1f} мкс, "
+            f"индекс {index / number * 1e6:6.2f} мкс"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Локальная замена Telegram Bot API для тестов и замеров без сети.
+
+Отвечает на вызовы бота (getMe, getUpdates, setWebhook, sendMessage, ...),
+записывает их и выдаёт боту подготовленные обновления — через long polling
+getUpdates или POST на вебхук, если бот его установил.
+
+Бот подключается к серверу через TELEGRAM_API_URL=<FakeBotApi.url>.
+"""
+import itertools
+import json
+import queue
+import threading
+import time
+import urllib.request
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+
+BOT_USER = {
+    "id": 1000,
+    "is_bot": True,
+    "first_name": "Fake Bot",
+    "username": "fake_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+# Методы, которые возвращают отправленное сообщение
+MESSAGE_METHODS = {
+    "sendMessage",
+    "editMessageText",
+    "sendVoice",
+    "sendAudio",
+    "sendDocument",
+}
+
+
+def _maybe_json(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def parse_body(content_type: str, body: bytes) -> Dict[str, Any]:
+    """Параметры запроса бота: JSON, urlencoded или multipart с файлами"""
+    if not body:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(body)
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        params = {}
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            payload = part.get_payload(decode=True) or b""
+            if part.get_filename():
+                params[name] = {"filename": part.get_filename(), "size": len(payload)}
+            else:
+                params[name] = _maybe_json(payload.decode("utf-8"))
+        return params
+    return {
+        key: _maybe_json(values[0])
+        for key, values in parse_qs(body.decode("utf-8")).items()
+    }
+
+
+class FakeBotApi:
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, webhook_workers: int = 8
+    ):
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+
+        self._cond = threading.Condition()
+        self._updates = []  # ожидающие getUpdates
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self.calls = []  # [(время, метод, параметры)]
+        self.listeners = []  # функции (время, метод, параметры) на каждый вызов
+
+        self.webhook_url = None
+        self.webhook_secret = None
+        self._webhook_queue = queue.Queue()
+        self.webhook_errors = 0
+        # Telegram доставляет вебхуки в несколько параллельных соединений
+        self.webhook_workers = webhook_workers
+        self.polling_started = threading.Event()
+        # Пользователи, которых getChatMember называет администраторами
+        self.admins = set()
+
+    # --- управление сервером ---
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        for _ in range(self.webhook_workers):
+            threading.Thread(target=self._deliver_webhooks, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._cond:
+            self._updates.clear()
+            self.calls.clear()
+
+    # --- обновления для бота ---
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        with self._cond:
+            update["update_id"] = next(self._update_ids)
+            if self.webhook_url:
+                self._webhook_queue.put(update)
+            else:
+                self._updates.append(update)
+                self._cond.notify_all()
+        return update["update_id"]
+
+    def message_update(
+        self, chat_id: int, text: str, user_id: int = 1, chat_type: str = "group"
+    ) -> Dict[str, Any]:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": chat_type, "title": f"Chat {chat_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            command = text.split()[0]
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(command)}
+            ]
+        return {"message": message}
+
+    def callback_update(
+        self, chat_id: int, data: str, user_id: int = 1
+    ) -> Dict[str, Any]:
+        return {
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                "chat_instance": str(chat_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "group", "title": f"Chat {chat_id}"},
+                    "from": BOT_USER,
+                    "text": "menu",
+                },
+            }
+        }
+
+    def _deliver_webhooks(self):
+        while True:
+            update = self._webhook_queue.get()
+            headers = {"Content-Type": "application/json"}
+            if self.webhook_secret:
+                headers["X-Telegram-Bot-Api-Secret-Token"] = self.webhook_secret
+            request = urllib.request.Request(
+                self.webhook_url,
+                data=json.dumps(update).encode(),
+                headers=headers,
+                method="POST",
+            )
+            try:
+                urllib.request.urlopen(request, timeout=10).read()
+            except Exception:
+                self.webhook_errors += 1
+
+    # --- вызовы бота ---
+
+    def wait_for_call(
+        self,
+        method: str,
+        predicate: Callable[[Dict[str, Any]], bool] = lambda params: True,
+        timeout: float = 10,
+        since: int = 0,
+    ) -> Optional[tuple]:
+        """Ждёт вызов method с подходящими параметрами среди calls[since:]"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for call in self.calls[since:]:
+                    if call[1] == method and predicate(call[2]):
+                        return call
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def _record(self, method: str, params: Dict[str, Any]):
+        call = (time.monotonic(), method, params)
+        with self._cond:
+            self.calls.append(call)
+            self._cond.notify_all()
+        for listener in self.listeners:
+            listener(*call)
+
+    def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        timeout = min(float(params.get("timeout") or 0), 10)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            return self._updates[:limit]
+
+    def _handle(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getUpdates":
+            self.polling_started.set()
+            return self._get_updates(params)
+        self._record(method, params)
+        if method == "getMe":
+            return BOT_USER
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.webhook_secret = params.get("secret_token")
+            return True
+        if method == "deleteWebhook":
+            self.webhook_url = None
+            return True
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url or "", "pending_update_count": 0}
+        if method == "getChatMember":
+            user_id = int(params.get("user_id") or 0)
+            return {
+                "status": "administrator" if user_id in self.admins else "member",
+                "user": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                # Поля, обязательные для ChatMemberAdministrator
+                "can_be_edited": False,
+                "is_anonymous": False,
+                "can_manage_chat": True,
+                "can_delete_messages": False,
+                "can_manage_video_chats": False,
+                "can_restrict_members": False,
+                "can_promote_members": False,
+                "can_change_info": False,
+                "can_invite_users": False,
+            }
+        if method in MESSAGE_METHODS:
+            result = {
+                "message_id": params.get("message_id") or next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id") or 0), "type": "group"},
+                "from": BOT_USER,
+            }
+            if "text" in params:
+                result["text"] = params["text"]
+            if method == "sendVoice":
+                result["voice"] = {
+                    "file_id": f"voice{result['message_id']}",
+                    "file_unique_id": f"uvoice{result['message_id']}",
+                    "duration": 1,
+                }
+            if method == "sendDocument":
+                result["document"] = {
+                    "file_id": f"doc{result['message_id']}",
+                    "file_unique_id": f"udoc{result['message_id']}",
+                }
+            return result
+        return True
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                params = parse_body(self.headers.get("Content-Type", ""), body)
+                self._respond(params)
+
+            def do_GET(self):
+                self._respond({})
+
+            def _respond(self, params: Dict[str, Any]):
+                # Путь: /bot<token>/<method>
+                method = self.path.rstrip("/").rsplit("/", 1)[-1].split("?")[0]
+                result = api._handle(method, params)
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    server = FakeBotApi(port=8081)
+    server.start()
+    print(f"Fake Bot API: TELEGRAM_API_URL={server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
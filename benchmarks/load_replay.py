@@ -0,0 +1,318 @@
+"""Нагрузочный прогон всего бота против локального fake_bot_api.
+
+Бот запускается отдельным процессом (polling или webhook) с заглушкой
+вместо edge_tts. Скрипт воспроизводит трассу обновлений из многих чатов —
+команды, нажатия кнопок, /slow_text — с заданной частотой, сопоставляет
+исходящие sendMessage/editMessageText/sendVoice с обновлениями и выводит
+пропускную способность, p50/p99 задержки ответа и долю ошибок.
+
+Трасса — JSONL: {"t": сек от начала, "chat_id", "user_id", "text" | "callback"}.
+Без --trace генерируется синтетическая с пуассоновскими приходами.
+
+Запуск:
+    python benchmarks/load_replay.py --rate 50 --duration 30 --chats 40
+    python benchmarks/load_replay.py --mode webhook --trace night.jsonl -o report.json
+    python benchmarks/load_replay.py --rate 400 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_polling_vs_webhook import start_bot, wait_ready
+from fake_bot_api import MESSAGE_METHODS, FakeBotApi
+
+# Доля видов обновлений в синтетической трассе
+TRACE_MIX = (
+    ("/win", 10),
+    ("/lose", 8),
+    ("/mvp", 14),
+    ("/lvp", 8),
+    ("/stats", 18),
+    ("callback:stats", 12),
+    ("callback:slow_mode", 4),
+    ("/help", 5),
+    ("/toxic", 6),
+    ("/blame", 5),
+    ("/make_challange", 4),
+    ("/slow_text", 6),
+)
+PHRASES = ("го катку", "лобби собрано", "кто на миде", "gg wp", "ещё одну")
+
+
+def synthetic_trace(
+    rate: float, duration: float, chats: int, players: int, seed: int = 0
+):
+    rng = random.Random(seed)
+    kinds, weights = zip(*TRACE_MIX)
+    # Активность чатов неравномерна: несколько «горячих» лобби и длинный хвост
+    chat_ids = [-1_000_000 - i for i in range(chats)]
+    chat_weights = [1 / (i + 1) for i in range(chats)]
+    t = 0.0
+    while True:
+        t += rng.expovariate(rate)
+        if t >= duration:
+            return
+        chat_id = rng.choices(chat_ids, chat_weights)[0]
+        user_id = rng.randint(1, players)
+        kind = rng.choices(kinds, weights)[0]
+        event = {"t": round(t, 4), "chat_id": chat_id, "user_id": user_id}
+        if kind.startswith("callback:"):
+            event["callback"] = kind.split(":", 1)[1]
+        elif kind in ("/mvp", "/lvp", "/toxic", "/blame"):
+            event["text"] = f"{kind} @Player{rng.randint(1, players)}"
+        elif kind == "/slow_text":
+            event["text"] = f"/slow_text {rng.choice(PHRASES)}"
+        else:
+            event["text"] = kind
+        yield event
+
+
+def read_trace(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def event_kind(event) -> str:
+    if "callback" in event:
+        return f"callback:{event['callback']}"
+    return event["text"].split()[0]
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class ReplyTracker:
+    """Сопоставляет исходящие вызовы бота с отправленными обновлениями"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = {}  # {(chat_id, message_id): (время, вид)}
+        self.latencies = {}  # {вид: [сек]}
+        self.errors = Counter()
+        self.busy = Counter()
+        self.sent = Counter()
+        self.methods = Counter()
+        self.last_reply = None
+
+    def expect(self, chat_id: int, message_id: int, kind: str):
+        with self._lock:
+            self.pending[(chat_id, message_id)] = (time.monotonic(), kind)
+            self.sent[kind] += 1
+
+    def on_call(self, at: float, method: str, params):
+        self.methods[method] += 1
+        if method not in MESSAGE_METHODS:
+            return
+        message_id = params.get("reply_to_message_id") or params.get("message_id")
+        key = (params.get("chat_id"), message_id)
+        with self._lock:
+            entry = self.pending.pop(key, None)
+            if entry is None:
+                return
+            started, kind = entry
+            self.latencies.setdefault(kind, []).append(at - started)
+            text = str(params.get("text", ""))
+            if text.startswith("❌"):
+                self.errors[kind] += 1
+            elif text.startswith("⏳"):
+                self.busy[kind] += 1
+            self.last_reply = at
+
+    def report(self, elapsed: float):
+        all_latencies = [v for values in self.latencies.values() for v in values]
+        sent = sum(self.sent.values())
+        replied = len(all_latencies)
+        failed = sum(self.errors.values()) + len(self.pending)
+
+        def summary(values):
+            return {
+                "replies": len(values),
+                "p50_ms": round(percentile(values, 0.5) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+            }
+
+        return {
+            "updates_sent": sent,
+            "replied": replied,
+            "lost": len(self.pending),
+            "errors": sum(self.errors.values()),
+            "busy": sum(self.busy.values()),
+            "error_rate": round(failed / sent, 4) if sent else 0.0,
+            "throughput_per_s": round(replied / elapsed, 2) if elapsed else 0.0,
+            **summary(all_latencies),
+            "by_kind": {
+                kind: {
+                    **summary(self.latencies.get(kind, [])),
+                    "sent": count,
+                    "errors": self.errors[kind],
+                    "busy": self.busy[kind],
+                }
+                for kind, count in sorted(self.sent.items())
+            },
+            "bot_api_calls": dict(sorted(self.methods.items())),
+        }
+
+
+def replay(api: FakeBotApi, tracker: ReplyTracker, events, speed: float):
+    """Отправляет обновления по расписанию трассы"""
+    started = time.monotonic()
+    for event in events:
+        delay = started + event["t"] / speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if "callback" in event:
+            update = api.callback_update(
+                event["chat_id"], event["callback"], event["user_id"]
+            )
+            message_id = update["callback_query"]["message"]["message_id"]
+        else:
+            update = api.message_update(
+                event["chat_id"], event["text"], event["user_id"]
+            )
+            message_id = update["message"]["message_id"]
+        tracker.expect(event["chat_id"], message_id, event_kind(event))
+        api.push_update(update)
+
+
+def run_bot():
+    """Точка входа процесса бота: edge_tts заменяется задержкой"""
+    import slow_text
+
+    delay = float(os.getenv("REPLAY_TTS_DELAY", "0.3"))
+
+    async def fake_synthesize(text: str) -> bytes:
+        await asyncio.sleep(delay)
+        return b"\xff\xf3" * (200 * len(text))
+
+    slow_text.synthesize = fake_synthesize
+
+    import group_bot
+
+    group_bot.main()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--trace", help="JSONL-трасса вместо синтетической")
+    parser.add_argument("--save-trace", help="сохранить сгенерированную трассу")
+    parser.add_argument("--rate", type=float, default=30, help="обновлений в секунду")
+    parser.add_argument("--duration", type=float, default=20, help="сек")
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--players", type=int, default=30, help="игроков на чат")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение трассы")
+    parser.add_argument("--tts-delay", type=float, default=0.3, help="сек на озвучку")
+    parser.add_argument(
+        "--telegram-limits",
+        action="store_true",
+        help="оставить лимиты отправки Telegram; по умолчанию сняты, "
+        "чтобы мерить сам бот",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="процессов-обработчиков (BOT_WORKERS); 0 — бот одним процессом",
+    )
+    parser.add_argument("--drain", type=float, default=30, help="ожидание ответов, сек")
+    parser.add_argument("-o", "--output", help="отчёт в JSON")
+    parser.add_argument("--run-bot", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_bot:
+        run_bot()
+        return
+
+    if args.trace:
+        events = list(read_trace(args.trace))
+    else:
+        events = list(
+            synthetic_trace(args.rate, args.duration, args.chats, args.players)
+        )
+    if args.save_trace:
+        with open(args.save_trace, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    extra_env = {
+        "REPLAY_TTS_DELAY": str(args.tts_delay),
+        "BOT_WORKERS": str(args.workers),
+    }
+    if not args.telegram_limits:
+        extra_env.update(
+            SEND_GLOBAL_RATE="1000000",
+            SEND_GROUP_PER_MINUTE="1000000",
+            SEND_PRIVATE_RATE="1000000",
+        )
+
+    api = FakeBotApi()
+    tracker = ReplyTracker()
+    api.listeners.append(tracker.on_call)
+    api.start()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            bot = start_bot(
+                api,
+                args.mode,
+                workdir,
+                args=[os.path.abspath(__file__), "--run-bot"],
+                extra_env=extra_env,
+            )
+            try:
+                if not wait_ready(api, args.mode):
+                    raise RuntimeError(f"бот не запустился в режиме {args.mode}")
+                print(f"Трасса: {len(events)} обновлений, режим {args.mode}")
+                started = time.monotonic()
+                replay(api, tracker, events, args.speed)
+                deadline = time.monotonic() + args.drain
+                while tracker.pending and time.monotonic() < deadline:
+                    time.sleep(0.1)
+            finally:
+                bot.send_signal(signal.SIGINT)
+                bot.wait(timeout=30)
+    finally:
+        api.stop()
+
+    # Пропускная способность — от начала трассы до последнего ответа
+    report = tracker.report((tracker.last_reply or started) - started)
+    report["mode"] = args.mode
+    report["workers"] = args.workers
+    report["webhook_errors"] = api.webhook_errors
+
+    print(
+        f"Отправлено {report['updates_sent']}, ответов {report['replied']}, "
+        f"потеряно {report['lost']}, ошибок {report['errors']}, "
+        f"занято {report['busy']}\n"
+        f"Пропускная способность {report['throughput_per_s']} обн/с, "
+        f"p50 {report['p50_ms']} мс, p99 {report['p99_ms']} мс"
+    )
+    for kind, row in report["by_kind"].items():
+        print(
+            f"  {kind:<20} {row['sent']:>6} отпр., p50 {row['p50_ms']:>8} мс, "
+            f"p99 {row['p99_ms']:>8} мс, ошибок {row['errors']}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from metrics import METRICS_PORT
+from send_scheduler import SEND_GLOBAL_RATE
+from tts_cache import TTS_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Число процессов-обработчиков; 0 — бот работает одним процессом
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))
+# Номер обработчика задаёт супервизор; переменная есть только у обработчиков
+WORKER_INDEX_ENV = "BOT_WORKER_INDEX"
+# Как часто обработчик сообщает, что жив, и через сколько молчания его
+# перезапускают
+WORKER_HEARTBEAT = float(os.getenv("BOT_WORKER_HEARTBEAT", "2"))
+WORKER_HEALTH_TIMEOUT = float(os.getenv("BOT_WORKER_HEALTH_TIMEOUT", "30"))
+# Сколько обновлений ждёт отправки одному обработчику, сверх — отбрасываются
+WORKER_QUEUE_SIZE = int(os.getenv("BOT_WORKER_QUEUE_SIZE", "10000"))
+# Сколько ждать завершения обработчика при остановке, сек
+WORKER_STOP_TIMEOUT = float(os.getenv("BOT_WORKER_STOP_TIMEOUT", "30"))
+# Максимальная пауза перед перезапуском упавшего обработчика, сек
+RESTART_BACKOFF_MAX = 30.0
+# Максимальная длина строки с обновлением
+MAX_UPDATE_BYTES = 16 * 1024 * 1024
+
+
+def routing_key(update: Update) -> int:
+    """По чату, а без чата (inline-запросы) — по пользователю"""
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return 0
+
+
+def worker_for(key: int, workers: int) -> int:
+    # Номер не зависит от запуска: чат всегда попадает к одному обработчику,
+    # и только он держит в памяти и пишет статистику этого чата
+    return key % workers
+
+
+def worker_env(index: int, workers: int) -> Dict[str, str]:
+    """Окружение обработчика: свои порт метрик, кэш озвучки и доля лимита,
+    общая база SQLite с фиксацией каждого изменения"""
+    env = dict(os.environ)
+    env[WORKER_INDEX_ENV] = str(index)
+    env["TTS_CACHE_DIR"] = os.path.join(TTS_CACHE_DIR, f"worker-{index}")
+    # Общий лимит Telegram на все чаты делится между процессами
+    env["SEND_GLOBAL_RATE"] = str(SEND_GLOBAL_RATE / workers)
+    # База SQLite одна на всех: транзакция не ждёт фоновой фиксации
+    env["STATS_DB_SHARED"] = "1"
+    if METRICS_PORT:
+        env["METRICS_PORT"] = str(METRICS_PORT + 1 + index)
+    return env
+
+
+class WorkerProcess:
+    """Процесс-обработчик на стороне супервизора.
+
+    Обновления передаются в stdin по одному JSON на строку, из stdout
+    приходят сигналы «жив». Упавший или зависший процесс перезапускается,
+    неотправленные обновления дожидаются нового процесса в очереди.
+    """
+
+    def __init__(self, index: int, command: List[str], env: Dict[str, str]):
+        self.index = index
+        self.command = command
+        self.env = env
+        self.process = None
+        self.queue = None
+        self.last_heartbeat = 0.0
+        self.health = {}
+        self.routed = 0
+        self.dropped = 0
+        self.restarts = 0
+        self._alive = None
+        self.ready = None
+        self._stopping = False
+        self._tasks = []
+
+    def start(self):
+        # Очередь и событие создаются уже в работающем event loop
+        self.queue = asyncio.Queue(WORKER_QUEUE_SIZE)
+        self._alive = asyncio.Event()
+        # Первый сигнал «жив» — обработчик запущен и принимает обновления
+        self.ready = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._supervise()),
+            asyncio.create_task(self._write_updates()),
+        ]
+
+    def route(self, data: bytes):
+        try:
+            self.queue.put_nowait(data)
+            self.routed += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Обработчик {self.index} перегружен, обновление отброшено")
+
+    async def _spawn(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            env=self.env,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=MAX_UPDATE_BYTES,
+        )
+        self.last_heartbeat = time.monotonic()
+        self._alive.set()
+        logger.info(f"Обработчик {self.index} запущен, pid {self.process.pid}")
+
+    async def _supervise(self):
+        delay = 0.5
+        while not self._stopping:
+            await self._spawn()
+            started = time.monotonic()
+            reader = asyncio.create_task(self._read_health(self.process))
+            code = await self._wait_healthy(self.process)
+            self._alive.clear()
+            reader.cancel()
+            if self._stopping:
+                return
+            self.restarts += 1
+            # Долго проработавший процесс перезапускаем сразу, часто
+            # падающий — с растущей паузой
+            if time.monotonic() - started > RESTART_BACKOFF_MAX:
+                delay = 0.5
+            delay = min(delay * 2, RESTART_BACKOFF_MAX)
+            logger.error(
+                f"Обработчик {self.index} завершился с кодом {code}, "
+                f"перезапуск через {delay:.0f} сек"
+            )
+            await asyncio.sleep(delay)
+
+    async def _wait_healthy(self, process) -> int:
+        """Ждёт завершения процесса; молчащий дольше таймаута — убивает"""
+        exited = asyncio.ensure_future(process.wait())
+        while True:
+            done, _ = await asyncio.wait({exited}, timeout=WORKER_HEARTBEAT)
+            if done:
+                return exited.result()
+            silent = time.monotonic() - self.last_heartbeat
+            if silent > WORKER_HEALTH_TIMEOUT and not self._stopping:
+                logger.error(
+                    f"Обработчик {self.index} не отвечает {silent:.0f} сек, "
+                    "процесс будет перезапущен"
+                )
+                process.kill()
+
+    async def _read_health(self, process):
+        async for line in process.stdout:
+            try:
+                self.health = json.loads(line)
+            except ValueError:
+                continue
+            self.last_heartbeat = time.monotonic()
+            self.ready.set()
+
+    async def _write_updates(self):
+        while True:
+            data = await self.queue.get()
+            while True:
+                await self._alive.wait()
+                process = self.process
+                try:
+                    process.stdin.write(data)
+                    await process.stdin.drain()
+                    break
+                except (BrokenPipeError, ConnectionResetError):
+                    # Процесс упал: обновление получит перезапущенный
+                    while self.process is process and not self._stopping:
+                        await asyncio.sleep(0.1)
+                    if self._stopping:
+                        break
+            self.queue.task_done()
+
+    async def stop(self):
+        """Передаёт оставшиеся обновления и ждёт, пока обработчик их доделает
+        и сохранит статистику"""
+        try:
+            await asyncio.wait_for(self.queue.join(), WORKER_STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Обработчик {self.index}: не переданы {self.queue.qsize()} обновлений"
+            )
+        self._stopping = True
+        process = self.process
+        if process is not None and process.returncode is None:
+            # Конец stdin — сигнал обработчику завершиться
+            process.stdin.close()
+            try:
+                await asyncio.wait_for(process.wait(), WORKER_STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Обработчик {self.index} не завершился, SIGKILL")
+                process.kill()
+                await process.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info(f"Обработчик {self.index} остановлен")
+
+    def stats(self) -> Dict[str, Any]:
+        alive = self.process is not None and self.process.returncode is None
+        return {
+            "alive": int(alive),
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "routed": self.routed,
+            "dropped": self.dropped,
+            "restarts": self.restarts,
+            "pending": self.health.get("pending", 0),
+        }
+
+
+class Supervisor:
+    """Раздаёт обновления процессам-обработчикам по chat_id.
+
+    Обработчики запускаются той же командой, что и супервизор, но с
+    BOT_WORKER_INDEX в окружении; каждый держит статистику только своих
+    чатов. Порядок обновлений одного чата сохраняется.
+    """
+
+    def __init__(self, workers: int = BOT_WORKERS, command: List[str] = None):
+        command = command or [sys.executable] + sys.argv
+        self.workers = [
+            WorkerProcess(index, command, worker_env(index, workers))
+            for index in range(workers)
+        ]
+
+    async def start(self, app: Application = None):
+        """Запускает обработчики и ждёт их готовности до приёма обновлений"""
+        for worker in self.workers:
+            worker.start()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker.ready.wait() for worker in self.workers)),
+                WORKER_HEALTH_TIMEOUT,
+            )
+        except asyncio.TimeoutError:
+            # Обновления дождутся обработчиков в очередях
+            logger.error("Не все обработчики запустились, приём обновлений начат")
+
+    async def stop(self, app: Application = None):
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+    async def route_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        data = json.dumps(update.to_dict(), ensure_ascii=False, separators=(",", ":"))
+        worker = self.workers[worker_for(routing_key(update), len(self.workers))]
+        worker.route(data.encode("utf-8") + b"\n")
+
+    def stats(self) -> Dict[str, Any]:
+        total = {}
+        for worker in self.workers:
+            for key, value in worker.stats().items():
+                total[key] = total.get(key, 0) + value
+        total["workers"] = len(self.workers)
+        return total
+
+
+def run_worker(app: Application, index: Optional[int] = None):
+    """Точка входа обработчика: обновления из stdin, состояние в stdout"""
+    if index is None:
+        index = int(os.environ[WORKER_INDEX_ENV])
+    # Ctrl+C получает вся группа процессов; останавливает обработчики
+    # супервизор, закрывая stdin, — иначе он принял бы их выход за падение
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(
+            logging.Formatter(
+                f"%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s"
+            )
+        )
+    asyncio.run(_serve(app))
+
+
+async def _serve(app: Application):
+    # stdout — канал состояния для супервизора, поэтому print уходит в stderr
+    control = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    reader = asyncio.StreamReader(limit=MAX_UPDATE_BYTES)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+    )
+
+    async with app:
+        await app.start()
+        tasks = [
+            asyncio.create_task(_read_updates(app, reader)),
+            asyncio.create_task(_heartbeat(app, control)),
+            asyncio.create_task(stop.wait()),
+        ]
+        # Конец stdin или SIGTERM
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in tasks:
+            task.cancel()
+        # Полученные обновления обрабатываются до конца
+        await app.stop()
+    if app.post_shutdown:
+        await app.post_shutdown(app)
+    control.close()
+
+
+async def _read_updates(app: Application, reader: asyncio.StreamReader):
+    async for line in reader:
+        try:
+            update = Update.de_json(json.loads(line), app.bot)
+        except ValueError as e:
+            logger.error(f"Некорректное обновление от супервизора: {e}")
+            continue
+        await app.update_queue.put(update)
+
+
+async def _heartbeat(app: Application, control):
+    while True:
+        message = {"pending": app.update_queue.qsize(), "ts": time.time()}
+        try:
+            control.write(json.dumps(message).encode() + b"\n")
+        except BrokenPipeError:
+            # Супервизор завершился — обработчик тоже останавливается
+            return
+        await asyncio.sleep(WORKER_HEARTBEAT)
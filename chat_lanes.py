@@ -0,0 +1,51 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict
+
+
+class ChatLanes:
+    """Очереди обработки обновлений по чатам.
+
+    Обновления разных чатов выполняются параллельно, а обработчики одного
+    чата, обёрнутые в serialized, — строго по одному и в порядке прихода:
+    asyncio.Lock будит ожидающих по очереди. Замок чата удаляется, когда
+    его никто не держит и не ждёт, поэтому словарь не растёт с числом чатов.
+    """
+
+    def __init__(self):
+        self._locks = {}  # {chat_id: asyncio.Lock}
+        self._waiters = {}  # {chat_id: число держащих и ждущих замок}
+
+    async def run(self, chat_id: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._waiters[chat_id] = self._waiters.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                return await func()
+        finally:
+            self._waiters[chat_id] -= 1
+            if not self._waiters[chat_id]:
+                del self._waiters[chat_id]
+                del self._locks[chat_id]
+
+    def serialized(self, handler: Callable) -> Callable:
+        """Обёртка обработчика PTB: обновления одного чата — по очереди"""
+
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            chat = update.effective_chat
+            if chat is None:
+                return await handler(update, context)
+            return await self.run(chat.id, lambda: handler(update, context))
+
+        return wrapper
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chats": len(self._locks),
+            "waiting": sum(self._waiters.values()) - sum(
+                lock.locked() for lock in self._locks.values()
+            ),
+        }
@@ -1,14 +1,34 @@
-import logging, os, random
+import asyncio, logging, os, random, tempfile, time
 
+from dotenv import load_dotenv
+
+# .env читается до импорта модулей бота: настройки из окружения они берут при импорте
+load_dotenv()
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
+from telegram.error import BadRequest, RetryAfter
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    CallbackQueryHandler,
+    ContextTypes,
+    MessageHandler,
+    TypeHandler,
+    filters,
+)
 from statistics_data import *
 from fun_commands import get_fun_response
-from dotenv import load_dotenv
-from slow_text import slow_text
+from slow_text import slow_text, tts_cache_stats, tts_scheduler
+from slow_voice import shutdown_pool, slow_voice
 
+from bot_workers import BOT_WORKERS, WORKER_INDEX_ENV, Supervisor, run_worker
 from challange import CHALLANGE_LIST
+from metrics import instrument_handler, registry, start_metrics_server
+from chat_lanes import ChatLanes
+from render_cache import RenderCache
+from send_scheduler import SendDropped, SendScheduler
+from stats_export import EXPORT_FORMATS
+from stats_windows import bucket_of, parse_window, window_label
 
 # Инициализация логгера
 logging.basicConfig(
@@ -16,6 +36,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Готовый текст /stats по чатам, пересчитывается только после изменений статистики
+stats_render_cache = RenderCache()
+# Обработчики статистики выполняются по одному на чат, остальное — параллельно
+chat_lanes = ChatLanes()
+send_scheduler = SendScheduler()
+
+# Периоды, доступные кнопками под статистикой
+STATS_WINDOWS = (("24h", "24 ч"), ("7d", "7 дней"), ("30d", "30 дней"))
+# Лимит Bot API на размер отправляемого файла
+EXPORT_MAX_BYTES = 50 * 1024 * 1024
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -35,7 +66,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def win_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    record_game_result(is_win=True)
+    await run_stats(record_game_result, update.effective_chat.id, is_win=True)
     await update.message.reply_text(
         "🏆 <b>Легенды! Поздравляю!</b>\n\n<b>Победа лобби записана!</b>",
         parse_mode="HTML",
@@ -43,7 +74,7 @@ async def win_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def lose_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    record_game_result(is_win=False)
+    await run_stats(record_game_result, update.effective_chat.id, is_win=False)
     await update.message.reply_text(
         "💀 <b>Не расстраивайся!</b>\n\n"
         "<i>MMR приходит и уходит. Самое главное - люди здесь, в этом чате!</i>\n\n"
@@ -64,10 +95,10 @@ async def handle_award_command(
 
     username = context.args[0]
     if award_type == "mvp":
-        add_mvp(username)
+        await run_stats(add_mvp, update.effective_chat.id, username)
         message = f"⭐ <b>MVP назначен {username}! Так держать!</b>"
     else:
-        add_lvp(username)
+        await run_stats(add_lvp, update.effective_chat.id, username)
         message = f"💀 <b>LVP назначен {username}! Ебать ты лох xD!</b>"
 
     await update.message.reply_text(message, parse_mode="HTML")
@@ -112,13 +143,21 @@ async def blame_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await handle_fun_command(update, context, "blame")
 
 
-async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    lobby = get_lobby_stats()
-    mvp = get_mvp_leaderboard()
-    lvp = get_lvp_leaderboard()
+def stats_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        [
+            [
+                InlineKeyboardButton(label, callback_data=f"stats:{window}")
+                for window, label in STATS_WINDOWS
+            ],
+            [InlineKeyboardButton("♾ За всё время", callback_data="stats")],
+        ]
+    )
+
 
+def format_stats(title: str, lobby, mvp, lvp) -> str:
     text = (
-        "📊 <b>Статистика лобби</b>\n\n"
+        f"📊 <b>{title}</b>\n\n"
         f"🎮 <i>Всего игр:</i> <b>{lobby['total_games']}</b>\n"
         f"🏆 <i>Побед:</i> <b>{lobby['wins']}</b>\n"
         f"💀 <i>Поражений:</i> <b>{lobby['losses']}</b>\n"
@@ -134,11 +173,105 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text += "\n\n💀 <b>Топ LVP:</b>\n" + "\n".join(
             f"▫️ {name}: <b>{count}</b>" for name, count in lvp
         )
+    return text
+
+
+def render_stats(chat_id: int) -> str:
+    lobby = get_lobby_stats(chat_id)
+    mvp = get_mvp_leaderboard(chat_id)
+    lvp = get_lvp_leaderboard(chat_id)
+    return format_stats("Статистика лобби", lobby, mvp, lvp)
+
+
+def render_window_stats(chat_id: int, unit: str, count: int) -> str:
+    stats = get_window_stats(chat_id, unit, count)
+    title = f"Статистика за {window_label(unit, count)}"
+    return format_stats(title, stats, stats["mvp"], stats["lvp"])
+
+
+async def show_stats(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, window=None
+):
+    """Статистика за всё время или за период: /stats 7d, /stats 24h"""
+    chat_id = update.effective_chat.id
+    if window is None and context.args:
+        window = parse_window(context.args[0])
+        if window is None:
+            await update.message.reply_text(
+                "❌ Укажите период в часах или днях, например: "
+                "<code>/stats 24h</code> или <code>/stats 7d</code>",
+                parse_mode="HTML",
+            )
+            return
+
+    if window is None:
+        key, version = chat_id, get_stats_version(chat_id)
+        text = stats_render_cache.get(key, version)
+        if text is None:
+            text = await run_stats(render_stats, chat_id)
+            stats_render_cache.put(key, version, text)
+    else:
+        unit, count = window
+        # Окно сдвигается каждый час, даже если статистика не менялась
+        key = (chat_id, unit, count)
+        version = (get_stats_version(chat_id), bucket_of(time.time(), "h"))
+        text = stats_render_cache.get(key, version)
+        if text is None:
+            text = await run_stats(render_window_stats, chat_id, unit, count)
+            stats_render_cache.put(key, version, text)
 
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode="HTML")
+        try:
+            await update.callback_query.edit_message_text(
+                text, parse_mode="HTML", reply_markup=stats_keyboard()
+            )
+        except BadRequest as e:
+            # Повторное нажатие той же кнопки: текст не изменился
+            if "not modified" not in str(e):
+                raise
     else:
-        await update.message.reply_text(text, parse_mode="HTML")
+        await update.message.reply_text(
+            text, parse_mode="HTML", reply_markup=stats_keyboard()
+        )
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузка статистики чата файлом: /export или /export csv"""
+    chat = update.effective_chat
+    if chat.type != "private":
+        member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
+        if member.status not in ("administrator", "creator"):
+            await update.message.reply_text(
+                "❌ Выгружать статистику могут только администраторы чата"
+            )
+            return
+    fmt = context.args[0].lower() if context.args else "ndjson"
+    if fmt not in EXPORT_FORMATS:
+        await update.message.reply_text(
+            "❌ Формат: <code>/export</code> (NDJSON) или <code>/export csv</code>",
+            parse_mode="HTML",
+        )
+        return
+
+    filename = f"stats_{chat.id}.{fmt}.gz"
+    fd, path = tempfile.mkstemp(suffix=".gz")
+    os.close(fd)
+    try:
+        # Игроки читаются пачками и сразу сжимаются в файл: память не растёт
+        # с размером чата. Отдельный поток, а не run_stats, — долгая выгрузка
+        # не задерживает запись статистики других чатов
+        size = await asyncio.to_thread(write_export, chat.id, path, fmt)
+        if size > EXPORT_MAX_BYTES:
+            await update.message.reply_text(
+                f"❌ Выгрузка слишком большая для Telegram: {size / 2**20:.0f} МБ"
+            )
+            return
+        with open(path, "rb") as f:
+            await update.message.reply_document(
+                f, filename=filename, caption="📦 Статистика чата"
+            )
+    finally:
+        os.remove(path)
 
 
 async def contacts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -180,11 +313,12 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "▫️ <b>/toxic @ник</b> - Токсичный комментарий\n"
         "▫️ <b>/motivate @ник</b> - Мотивировать игрока\n"
         "▫️ <b>/blame @ник</b> - Обвинить игрока\n\n"
-        "📊 <b>/stats</b> - Показать статистику\n"
+        "📊 <b>/stats</b> [24h|7d|30d] - Показать статистику (за всё время или за период)\n"
+        "📦 <b>/export</b> [csv] - Выгрузить статистику файлом (для администраторов)\n"
         "⚔️ <b>/make_challange</b> - Сделать случайный вызов на игру\n"
         "❓ <b>/help</b> - Эта справка\n\n"
         "🐌 <b>Замедление:</b>\n"
-        "🔉 <b>/slow_voice</b> + голосовое/аудио — замедлить аудио(Пока в разработке)\n"
+        "🔉 <b>/slow_voice</b> + голосовое/аудио — замедлить аудио (ответом на сообщение или в подписи)\n"
         "💬 <b>/slow_text</b> [текст] — преобразовать текст в замедленную речь\n"
     )
     await update.message.reply_text(help_text, parse_mode="HTML")
@@ -192,6 +326,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.error(f"Ошибка: {context.error}")
+    if isinstance(context.error, (SendDropped, RetryAfter)):
+        # Чат и так перегружен — ответ об ошибке только добавил бы сообщений
+        return
     if update.callback_query:
         await update.callback_query.message.reply_text(
             "❌ Произошла ошибка. Попробуйте еще раз."
@@ -207,6 +344,10 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         if query.data == "stats":
             await show_stats(update, context)
+        elif query.data.startswith("stats:"):
+            window = parse_window(query.data.split(":", 1)[1])
+            if window is not None:
+                await show_stats(update, context, window)
         elif query.data == "help":
             await help_command(update, context)
         elif query.data == "contacts":
@@ -246,27 +387,54 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("❌ Произошла ошибка. Попробуйте еще раз.")
 
 
-def main():
-    load_dotenv()
-    token = os.getenv("TELEGRAM_TOKEN")
-    if not token:
-        raise ValueError("Не указан TELEGRAM_TOKEN в .env файле")
+async def on_shutdown(app: Application):
+    # Дописываем отложенные изменения статистики перед выходом
+    await run_stats(close_stats)
+    await tts_scheduler.close()
+    shutdown_pool()
 
-    app = Application.builder().token(token).build()
+
+def _with_api_url(builder):
+    # Адрес Bot API можно подменить, например на локальный тестовый сервер
+    api_url = os.getenv("TELEGRAM_API_URL")
+    if api_url:
+        builder = builder.base_url(f"{api_url}/bot").base_file_url(
+            f"{api_url}/file/bot"
+        )
+    return builder
+
+
+def build_application(token: str, updater: bool = True) -> Application:
+    """Бот целиком; updater=False — для обработчика, которому обновления
+    передаёт супервизор"""
+    builder = (
+        Application.builder()
+        .token(token)
+        .connection_pool_size(int(os.getenv("BOT_CONNECTION_POOL_SIZE", "256")))
+        .pool_timeout(float(os.getenv("BOT_POOL_TIMEOUT", "5")))
+        .concurrent_updates(int(os.getenv("BOT_CONCURRENT_UPDATES", "256")))
+        .rate_limiter(send_scheduler)
+        .post_shutdown(on_shutdown)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    app = _with_api_url(builder).build()
 
     # Основные команды
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
-    app.add_handler(CommandHandler("stats", show_stats))
+    app.add_handler(CommandHandler("stats", chat_lanes.serialized(show_stats)))
     app.add_handler(CommandHandler("contacts", contacts_command))
+    # Выгрузка только читает статистику и идёт вне очереди чата
+    app.add_handler(CommandHandler("export", export_command))
 
     # Статистика лобби
-    app.add_handler(CommandHandler("win", win_command))
-    app.add_handler(CommandHandler("lose", lose_command))
+    app.add_handler(CommandHandler("win", chat_lanes.serialized(win_command)))
+    app.add_handler(CommandHandler("lose", chat_lanes.serialized(lose_command)))
 
     # Награды игрокам
-    app.add_handler(CommandHandler("mvp", mvp_command))
-    app.add_handler(CommandHandler("lvp", lvp_command))
+    app.add_handler(CommandHandler("mvp", chat_lanes.serialized(mvp_command)))
+    app.add_handler(CommandHandler("lvp", chat_lanes.serialized(lvp_command)))
 
     # Развлекательные команды
     app.add_handler(CommandHandler("toxic", toxic_command))
@@ -275,14 +443,91 @@ def main():
     app.add_handler(CommandHandler("blame", blame_command))
 
     # Обработчики кнопок
-    app.add_handler(CallbackQueryHandler(button_handler))
+    app.add_handler(CallbackQueryHandler(chat_lanes.serialized(button_handler)))
+
+    # Озвучка и замедление долгие и статистику не трогают: они идут вне
+    # очереди чата и не задерживают быстрые команды
     app.add_handler(CommandHandler("slow_text", slow_text))
+    app.add_handler(CommandHandler("slow_voice", slow_voice))
+    # Голосовое с /slow_voice в подписи, а в личке — любое голосовое
+    app.add_handler(
+        MessageHandler(
+            (filters.VOICE | filters.AUDIO)
+            & (filters.CaptionRegex(r"^/slow_voice") | filters.ChatType.PRIVATE),
+            slow_voice,
+        )
+    )
     app.add_handler(CommandHandler("make_challange", challange_command))
 
     # Обработчики ошибок
     app.add_error_handler(error_handler)
 
-    app.run_polling()
+    # Метрики: время, ошибки и число выполняющихся для каждого обработчика
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            commands = getattr(handler, "commands", None)
+            name = min(commands) if commands else handler.callback.__name__
+            handler.callback = instrument_handler(name, handler.callback)
+    registry.add_collector("bot_send", send_scheduler.stats)
+    registry.add_collector("bot_tts_cache", tts_cache_stats)
+    registry.add_collector("bot_tts_queue", tts_scheduler.stats)
+    registry.add_collector("bot_stats_render_cache", stats_render_cache.stats)
+    registry.add_collector("bot_chat_lanes", chat_lanes.stats)
+
+    return app
+
+
+def build_ingress(token: str, supervisor: Supervisor) -> Application:
+    """Приём обновлений для BOT_WORKERS > 0: обработка — в процессах supervisor.
+
+    Обновления раздаются по одному, поэтому порядок внутри чата сохраняется.
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .post_init(supervisor.start)
+        .post_shutdown(supervisor.stop)
+    )
+    app = _with_api_url(builder).build()
+    app.add_handler(TypeHandler(Update, supervisor.route_update))
+    registry.add_collector("bot_workers", supervisor.stats)
+    return app
+
+
+def main():
+    token = os.getenv("TELEGRAM_TOKEN")
+    if not token:
+        raise ValueError("Не указан TELEGRAM_TOKEN в .env файле")
+
+    if os.getenv(WORKER_INDEX_ENV) is not None:
+        # Процесс-обработчик, запущенный супервизором
+        app = build_application(token, updater=False)
+        start_metrics_server()
+        run_worker(app)
+        return
+
+    if BOT_WORKERS > 0:
+        app = build_ingress(token, Supervisor(BOT_WORKERS))
+    else:
+        app = build_application(token)
+    start_metrics_server()
+
+    mode = os.getenv("BOT_MODE", "polling")
+    if mode == "webhook":
+        webhook_url = os.getenv("WEBHOOK_URL")
+        if not webhook_url:
+            raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_URL")
+        app.run_webhook(
+            listen=os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8443")),
+            url_path=os.getenv("WEBHOOK_PATH", ""),
+            secret_token=os.getenv("WEBHOOK_SECRET"),
+            webhook_url=webhook_url,
+        )
+    elif mode == "polling":
+        app.run_polling()
+    else:
+        raise ValueError(f"Неизвестный BOT_MODE: {mode}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Tuple
+
+
+class Leaderboard:
+    """Рейтинг, обновляемый по одному игроку без полной сортировки.
+
+    Хранит отсортированный список ключей (-count, ник, user_id): чтение
+    топа — срез списка, изменение счётчика — бинарный поиск и вставка.
+    При равенстве очков порядок детерминирован: по нику, затем по user_id.
+    """
+
+    def __init__(self):
+        self._order = []  # [(-count, ник в нижнем регистре, user_id)]
+        self._keys = {}  # {user_id: ключ в _order}
+        self._names = {}  # {user_id: ник для вывода}
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def update(self, user_id: str, count: int, username: str):
+        self.remove(user_id)
+        if count <= 0:
+            return
+        key = (-count, (username or "").lower(), user_id)
+        insort(self._order, key)
+        self._keys[user_id] = key
+        self._names[user_id] = username
+
+    def remove(self, user_id: str):
+        key = self._keys.pop(user_id, None)
+        if key is None:
+            return
+        del self._order[bisect_left(self._order, key)]
+        del self._names[user_id]
+
+    def rebuild(self, entries: Iterable[Tuple[str, int, str]]):
+        """Полная пересборка из (user_id, count, username)"""
+        self._keys = {}
+        self._names = {}
+        order = []
+        for user_id, count, username in entries:
+            if count > 0:
+                key = (-count, (username or "").lower(), user_id)
+                order.append(key)
+                self._keys[user_id] = key
+                self._names[user_id] = username
+        order.sort()
+        self._order = order
+
+    def top(self, offset: int = 0, limit: int = 10) -> List[Tuple[str, int]]:
+        return [
+            (self._names[user_id], -neg_count)
+            for neg_count, _, user_id in self._order[offset : offset + limit]
+        ]
@@ -0,0 +1,233 @@
+import asyncio
+import bisect
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Порт эндпоинта /metrics; 0 — метрики выключены и обработчики не оборачиваются
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+# Обработчики дольше порога пишутся в лог медленных обновлений; 0 — выключено
+SLOW_HANDLER_SECONDS = float(os.getenv("SLOW_HANDLER_SECONDS", "0"))
+
+METRICS_ENABLED = METRICS_PORT > 0
+INSTRUMENTED = METRICS_ENABLED or SLOW_HANDLER_SECONDS > 0
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Счётчики, гистограммы и gauge в памяти процесса.
+
+    Обновляются из event loop и потока статистики; под GIL отдельные
+    операции над словарями и числами атомарны, а редкий рассинхрон
+    счётчиков внутри одного снимка для мониторинга не важен.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # {(имя, метки): Histogram}
+        self.counters = {}  # {(имя, метки): число}
+        self.gauges = {}  # {(имя, метки): число}
+        self.collectors = []  # [(префикс, функция → dict)]
+
+    def observe(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float):
+        histogram = self.histograms.get((name, labels))
+        if histogram is None:
+            histogram = self.histograms[(name, labels)] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float = 1):
+        self.counters[(name, labels)] = self.counters.get((name, labels), 0) + value
+
+    def add_gauge(self, name: str, labels: Tuple[Tuple[str, str], ...], value: float):
+        self.gauges[(name, labels)] = self.gauges.get((name, labels), 0) + value
+
+    def add_collector(self, prefix: str, collect: Callable[[], Dict[str, Any]]):
+        """Числовые поля collect() отдаются как gauge prefix_<поле>"""
+        self.collectors.append((prefix, collect))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for kind, items in (("counter", self.counters), ("gauge", self.gauges)):
+            for name, series in _group(items).items():
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+
+        for name, series in _group(self.histograms).items():
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series:
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(f"{name}_bucket{_labels(bucket_labels)} {cumulative}")
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_labels(inf_labels)} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        for prefix, collect in self.collectors:
+            try:
+                values = collect()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик {prefix}: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{key} gauge")
+                    lines.append(f"{prefix}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _group(items: Dict[Tuple[str, Any], Any]) -> Dict[str, List[Tuple[Any, Any]]]:
+    grouped = {}
+    for (name, labels), value in list(items.items()):
+        grouped.setdefault(name, []).append((labels, value))
+    return grouped
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = Registry()
+
+
+@contextlib.contextmanager
+def timer(operation: str):
+    """Время блока в bot_operation_duration_seconds; без метрик — ничего"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(
+            "bot_operation_duration_seconds",
+            (("operation", operation),),
+            time.perf_counter() - started,
+        )
+
+
+def timed(operation: str) -> Callable:
+    """Декоратор: время выполнения функции в bot_operation_duration_seconds.
+
+    При выключенных метриках возвращает функцию без изменений.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if not METRICS_ENABLED:
+            return func
+
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(operation):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_handler(name: str, callback: Callable) -> Callable:
+    """Обёртка обработчика PTB: время, число выполняющихся, ошибки и лог медленных"""
+    if not INSTRUMENTED:
+        return callback
+    labels = (("handler", name),)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        if METRICS_ENABLED:
+            registry.add_gauge("bot_handler_in_flight", labels, 1)
+        try:
+            return await callback(update, context)
+        except Exception:
+            if METRICS_ENABLED:
+                registry.inc("bot_handler_errors_total", labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if METRICS_ENABLED:
+                registry.add_gauge("bot_handler_in_flight", labels, -1)
+                registry.observe("bot_handler_duration_seconds", labels, elapsed)
+            if SLOW_HANDLER_SECONDS and elapsed > SLOW_HANDLER_SECONDS:
+                chat = getattr(update, "effective_chat", None)
+                logger.warning(
+                    f"Медленный обработчик {name}: {elapsed:.3f} сек, "
+                    f"update_id={getattr(update, 'update_id', None)}, "
+                    f"chat_id={chat.id if chat else None}"
+                )
+
+    return wrapper
+
+
+def start_metrics_server() -> Optional["ThreadingHTTPServer"]:
+    """Запускает HTTP-эндпоинт /metrics в фоновом потоке"""
+    if not METRICS_ENABLED:
+        return None
+    # http.server нужен только при включённых метриках
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((METRICS_LISTEN, METRICS_PORT), Handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    logger.info(f"Метрики: http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
+    return server
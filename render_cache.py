@@ -0,0 +1,44 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class RenderCache:
+    """Кэш готовых сообщений, привязанный к версии состояния.
+
+    Запись действительна, пока версия данных не изменилась: любое изменение
+    статистики чата увеличивает версию, и следующий запрос перерисует текст.
+    Блокировок нет: get и put вызываются только из потока event loop.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # {key: (version, text)}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, version: int, text: str):
+        self._entries[key] = (version, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
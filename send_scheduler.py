@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота, 20 в минуту в группу,
+# 1 в секунду в личный чат
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_GROUP_PER_MINUTE = float(os.getenv("SEND_GROUP_PER_MINUTE", "20"))
+SEND_PRIVATE_RATE = float(os.getenv("SEND_PRIVATE_RATE", "1"))
+# Сколько раз повторять запрос после RetryAfter
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+# Запрос, которому пришлось бы ждать очереди дольше, отбрасывается, сек
+SEND_MAX_WAIT = float(os.getenv("SEND_MAX_WAIT", "30"))
+
+# Сколько простаивающих корзин чатов держать, прежде чем чистить
+MAX_IDLE_BUCKETS = 10000
+# Методы, которые публикуют сообщение в чат: только они расходуют лимит чата.
+# Служебные запросы с chat_id (getChatMember, getChat, ...) идут по общему
+SEND_PREFIXES = ("send", "edit", "copy", "forward")
+NOT_SENDS = {"sendChatAction"}
+
+
+def is_chat_send(endpoint: str) -> bool:
+    return endpoint.startswith(SEND_PREFIXES) and endpoint not in NOT_SENDS
+
+
+class SendDropped(TelegramError):
+    """Запрос не отправлен: очередь чата слишком длинная"""
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        # Выдача токенов по очереди: кто раньше пришёл, тот раньше отправит
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Через сколько секунд появится токен"""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity and not self.lock.locked()
+
+
+class SendScheduler(BaseRateLimiter):
+    """Единая точка для всех исходящих запросов к Bot API.
+
+    Подключается к Application через rate_limiter, поэтому обработчики
+    по-прежнему вызывают reply_text/edit_message_text напрямую.
+
+    - Сообщения в чат проходят через корзину токенов чата и общую корзину
+      бота, служебные запросы — только через общую.
+    - RetryAfter приостанавливает все отправки на указанное время, после
+      чего запрос повторяется.
+    - Несколько edit_message_text одного сообщения, ждущих очереди,
+      схлопываются: отправляется только последний текст.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = SEND_GLOBAL_RATE,
+        group_per_minute: float = SEND_GROUP_PER_MINUTE,
+        private_rate: float = SEND_PRIVATE_RATE,
+        max_retries: int = SEND_MAX_RETRIES,
+        max_wait: float = SEND_MAX_WAIT,
+    ):
+        self.global_rate = global_rate
+        self.group_per_minute = group_per_minute
+        self.private_rate = private_rate
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+
+        self._global = None
+        self._chats = {}  # {chat_id: TokenBucket}
+        self._paused_until = 0.0
+        self._edit_seq = itertools.count()
+        self._latest_edits = {}  # {(chat_id, message_id): номер последней правки}
+
+        self.sent = 0
+        self.delayed = 0
+        self.delay_seconds = 0.0
+        self.coalesced = 0
+        self.dropped = 0
+        self.retried = 0
+        self.failed = 0
+
+    async def initialize(self):
+        # Замки корзин создаются уже в event loop приложения
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+
+    async def shutdown(self):
+        logger.info(f"Исходящие запросы: {self.stats()}")
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= MAX_IDLE_BUCKETS:
+                self._chats = {
+                    key: value for key, value in self._chats.items() if not value.idle()
+                }
+            try:
+                private = int(chat_id) > 0
+            except (TypeError, ValueError):
+                private = False  # @username канала
+            if private:
+                bucket = TokenBucket(self.private_rate, 1)
+            else:
+                bucket = TokenBucket(
+                    self.group_per_minute / 60, self.group_per_minute
+                )
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, bucket: TokenBucket, started: float):
+        async with bucket.lock:
+            while True:
+                wait = max(bucket.wait_time(), self._paused_until - time.monotonic())
+                if wait <= 0:
+                    bucket.take()
+                    return
+                if time.monotonic() + wait - started > self.max_wait:
+                    self.dropped += 1
+                    raise SendDropped("Слишком много сообщений в чат")
+                await asyncio.sleep(wait)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. — без лимитов на чат
+            return await self._call_with_retry(callback, args, kwargs)
+        if not is_chat_send(endpoint):
+            # Проверка прав и т.п. не должна отнимать у чата лимит сообщений
+            await self._acquire(self._global, time.monotonic())
+            return await self._call_with_retry(callback, args, kwargs)
+
+        edit_key = None
+        if endpoint == "editMessageText" and "message_id" in data:
+            edit_key = (chat_id, data["message_id"])
+            seq = next(self._edit_seq)
+            self._latest_edits[edit_key] = seq
+
+        started = time.monotonic()
+        chat_bucket = self._chat_bucket(chat_id)
+        try:
+            await self._acquire(chat_bucket, started)
+            if edit_key is not None and self._latest_edits.get(edit_key) != seq:
+                # За этой правкой стоит более новая — отправится только она
+                chat_bucket.refund()
+                self.coalesced += 1
+                return True
+            await self._acquire(self._global, started)
+
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.delayed += 1
+                self.delay_seconds += waited
+            return await self._call_with_retry(callback, args, kwargs)
+        finally:
+            if edit_key is not None and self._latest_edits.get(edit_key) == seq:
+                del self._latest_edits[edit_key]
+
+    async def _call_with_retry(self, callback, args, kwargs) -> Any:
+        for attempt in range(self.max_retries + 1):
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retried += 1
+                # Flood wait касается всего бота: приостанавливаем все отправки
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + float(e.retry_after)
+                )
+                logger.warning(f"RetryAfter {e.retry_after} сек, повтор запроса")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "delayed": self.delayed,
+            "delay_seconds": round(self.delay_seconds, 3),
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "retried": self.retried,
+            "failed": self.failed,
+            "chats": len(self._chats),
+        }
@@ -1,27 +1,87 @@
+import asyncio
+import io
+import logging
 import os
-import edge_tts
+from typing import Any, Dict
+
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 
-os.makedirs("temp", exist_ok=True)
+from metrics import timed
+from tts_cache import TtsCache, cache_key
+from tts_scheduler import SchedulerBusy, SynthesisScheduler
 
+logger = logging.getLogger(__name__)
 
-async def text_to_slow_speech(text: str, user_id: int) -> str:
-    """Преобразует текст в замедленную речь с мужским голосом через edge_tts"""
-    mp3_path = f"temp/{user_id}_speech.mp3"
+VOICE = "ru-RU-DmitryNeural"
+RATE = "-50%"
 
-    voice = "ru-RU-DmitryNeural"
-    rate = "-50%"
+# Ограничения на результат синтеза: размер mp3 и длительность речи
+TTS_MAX_AUDIO_BYTES = int(os.getenv("TTS_MAX_AUDIO_BYTES", str(5 * 1024 * 1024)))
+TTS_MAX_DURATION = float(os.getenv("TTS_MAX_DURATION", "300"))
 
-    try:
-        communicate = edge_tts.Communicate(text, voice, rate=rate)
-        await communicate.save(mp3_path)
-        if os.path.exists(mp3_path):
-            return mp3_path
+# Кэш создаётся при первой озвучке: конструктор читает каталог кэша с диска
+_tts_cache = None
+tts_scheduler = SynthesisScheduler()
+# Ссылки на фоновые записи в кэш, чтобы задачи не собрал сборщик мусора
+_background_tasks = set()
+
+
+class AudioTooLong(Exception):
+    """Озвучка превысила TTS_MAX_AUDIO_BYTES или TTS_MAX_DURATION"""
+
+
+def get_tts_cache() -> TtsCache:
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TtsCache()
+    return _tts_cache
+
+
+def tts_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша для метрик; пустая, пока озвучек не было"""
+    return _tts_cache.stats() if _tts_cache is not None else {}
 
-    except Exception as e:
-        print(f"Ошибка в text_to_slow_speech: {e}")
-        return None
+
+@timed("tts_synthesis")
+async def synthesize(text: str) -> bytes:
+    """Синтезирует речь потоком в память, без временных файлов"""
+    # edge_tts (и aiohttp) нужны только для синтеза, не для запуска бота
+    import edge_tts
+
+    buffer = io.BytesIO()
+    communicate = edge_tts.Communicate(text, VOICE, rate=RATE)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            buffer.write(chunk["data"])
+            if buffer.tell() > TTS_MAX_AUDIO_BYTES:
+                raise AudioTooLong()
+        elif chunk["type"] == "WordBoundary":
+            # offset и duration в edge_tts измеряются в тиках по 100 нс
+            if (chunk["offset"] + chunk["duration"]) / 1e7 > TTS_MAX_DURATION:
+                raise AudioTooLong()
+    return buffer.getvalue()
+
+
+async def text_to_slow_speech(text: str) -> bytes:
+    """Преобразует текст в замедленную речь с мужским голосом через edge_tts.
+
+    Повтор той же фразы берётся из дискового кэша; новый результат
+    сохраняется в кэш в фоне и не задерживает отправку.
+    """
+    tts_cache = get_tts_cache()
+    key = cache_key(text, VOICE, RATE)
+    audio = await tts_cache.read(key)
+    if audio is not None:
+        return audio
+
+    audio = await synthesize(text)
+    if audio:
+        task = asyncio.create_task(tts_cache.store(key, audio))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return audio
 
 
 async def slow_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -34,19 +94,53 @@ async def slow_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     text = " ".join(context.args)
+    caption = f"🗣 <b>Замееееедленный голос:</b> <i>{text}</i>"
+    key = cache_key(text, VOICE, RATE)
     try:
-        slowed_path = await text_to_slow_speech(text, update.effective_user.id)
+        tts_cache = get_tts_cache()
+        file_id = tts_cache.get_file_id(key)
+        if file_id:
+            try:
+                await update.message.reply_voice(
+                    voice=file_id, caption=caption, parse_mode="HTML"
+                )
+                return
+            except BadRequest:
+                tts_cache.forget_file_id(key)
+
+        try:
+            future, ahead = tts_scheduler.submit(
+                key, update.effective_user.id, lambda: text_to_slow_speech(text)
+            )
+        except SchedulerBusy as e:
+            if e.reason == "user":
+                await update.message.reply_text(
+                    "⏳ Дождитесь озвучки предыдущих сообщений и попробуйте снова."
+                )
+            else:
+                await update.message.reply_text(
+                    "⏳ Слишком много запросов на озвучку, попробуйте позже."
+                )
+            return
 
-        if slowed_path:
-            await update.message.reply_voice(
-                voice=open(slowed_path, "rb"),
-                caption=f"🗣 <b>Замееееедленный голос:</b> <i>{text}</i>",
-                parse_mode="HTML",
+        if ahead:
+            await update.message.reply_text(
+                f"⏳ Запрос в очереди, перед вами: {ahead}"
             )
+        # shield: отмена одного из ожидающих не отменяет общую задачу
+        audio = await asyncio.shield(future)
 
-            # Удаляем временные файлы
-            if os.path.exists(slowed_path):
-                os.remove(slowed_path)
+        if audio:
+            message = await update.message.reply_voice(
+                voice=audio, caption=caption, parse_mode="HTML"
+            )
+            sent = message.voice or message.audio
+            if sent:
+                tts_cache.put_file_id(key, sent.file_id, len(audio))
+                await tts_cache.save_file_ids()
+            logger.info(f"Кэш озвучки: {tts_cache.stats()}")
 
+    except AudioTooLong:
+        await update.message.reply_text("❌ Слишком длинный текст для озвучки.")
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
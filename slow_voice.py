@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+# Во сколько раз замедлять: 0.5 — вдвое медленнее, как у /slow_text
+SLOW_VOICE_RATE = float(os.getenv("SLOW_VOICE_RATE", "0.5"))
+# Максимальная длительность входного аудио, сек
+SLOW_VOICE_MAX_DURATION = float(os.getenv("SLOW_VOICE_MAX_DURATION", "120"))
+SLOW_VOICE_WORKERS = int(os.getenv("SLOW_VOICE_WORKERS", "2"))
+
+_pool = None
+
+
+class AudioTooLong(Exception):
+    """Входное аудио длиннее SLOW_VOICE_MAX_DURATION"""
+
+
+def slow_down_audio(data: bytes, rate: float = SLOW_VOICE_RATE) -> bytes:
+    """Полный конвейер: декодирование, замедление, кодирование в Opus.
+
+    Выполняется в отдельном процессе пула.
+    """
+    from audio_stretch import SAMPLE_RATE, decode, encode, time_stretch
+
+    samples = decode(data, SLOW_VOICE_MAX_DURATION)
+    if len(samples) > SLOW_VOICE_MAX_DURATION * SAMPLE_RATE:
+        raise AudioTooLong()
+    return encode(time_stretch(samples, rate))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, а не fork: к первому /slow_voice у бота уже работают потоки
+        # статистики и записи, и форк мог унаследовать их захваченные блокировки
+        _pool = ProcessPoolExecutor(
+            max_workers=SLOW_VOICE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def slow_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик /slow_voice: ответом на голосовое/аудио или с ним в подписи"""
+    message = update.message
+    media = message.voice or message.audio
+    if not media and message.reply_to_message:
+        media = message.reply_to_message.voice or message.reply_to_message.audio
+    if not media:
+        await message.reply_text(
+            "❌ Ответьте командой <code>/slow_voice</code> на голосовое или аудио, "
+            "либо отправьте его с этой командой в подписи.",
+            parse_mode="HTML",
+        )
+        return
+
+    if media.duration and media.duration > SLOW_VOICE_MAX_DURATION:
+        await message.reply_text(
+            f"❌ Слишком длинное аудио: максимум {SLOW_VOICE_MAX_DURATION:.0f} сек."
+        )
+        return
+
+    try:
+        file = await media.get_file()
+        data = bytes(await file.download_as_bytearray())
+        loop = asyncio.get_running_loop()
+        slowed = await loop.run_in_executor(_get_pool(), slow_down_audio, data)
+        await message.reply_voice(
+            voice=slowed, caption="🐌 <b>Зааамеедлено</b>", parse_mode="HTML"
+        )
+    except AudioTooLong:
+        await message.reply_text(
+            f"❌ Слишком длинное аудио: максимум {SLOW_VOICE_MAX_DURATION:.0f} сек."
+        )
+    except Exception as e:
+        await message.reply_text(f"❌ Ошибка: {str(e)}")
@@ -1,115 +1,117 @@
-import json
+import asyncio
+import atexit
+import functools
 import os
-from datetime import datetime
-from typing import Dict, Any, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Dict, Any, Iterator, List, Tuple
 
-STATS_FILE = "group_stats.json"
+import stats_export
+from stats_backend import StatsBackend
 
-# Глобальные данные
-lobby_stats = {"total_games": 0, "wins": 0, "losses": 0}
+# Хранилище статистики: json (файлы на каждый чат) или sqlite
+STATS_BACKEND = os.getenv("STATS_BACKEND", "json")
 
-player_stats = {}  # {user_id: {mvp_count: X, lvp_count: Y, username: str}}
+_backend = None
+# Версия данных каждого чата: растёт при любом изменении, по ней сверяются кэши
+_versions = {}
+# Все обращения к хранилищу из бота идут через один поток, вне event loop
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats")
 
 
-def load_stats():
-    global lobby_stats, player_stats
-    if os.path.exists(STATS_FILE):
-        try:
-            with open(STATS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                lobby_stats = data.get(
-                    "lobby_stats", {"total_games": 0, "wins": 0, "losses": 0}
-                )
-                player_stats = data.get("player_stats", {})
-        except Exception as e:
-            print(f"Ошибка загрузки: {e}")
+def get_backend() -> StatsBackend:
+    global _backend
+    if _backend is None:
+        if STATS_BACKEND == "sqlite":
+            from stats_sqlite import SqliteStatsBackend
+
+            _backend = SqliteStatsBackend()
+        elif STATS_BACKEND == "json":
+            from stats_json import JsonStatsBackend
+
+            _backend = JsonStatsBackend()
+        else:
+            raise ValueError(f"Неизвестное хранилище статистики: {STATS_BACKEND}")
+    return _backend
+
+
+async def run_stats(func, *args, **kwargs):
+    """Выполняет функцию статистики в отдельном потоке, не блокируя бота"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def load_stats(chat_id):
+    """Загружает статистику чата заранее, до первого обращения"""
+    return get_backend().load_chat(str(chat_id))
 
 
 def save_stats():
-    data = {"lobby_stats": lobby_stats, "player_stats": player_stats}
-    with open(STATS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
-def register_player(user_id: str, username: str):
-    if user_id not in player_stats:
-        player_stats[user_id] = {
-            "mvp_count": 0,
-            "lvp_count": 0,
-            "username": username,
-            "first_seen": datetime.now().isoformat(),
-        }
-    elif username and player_stats[user_id]["username"] != username:
-        player_stats[user_id]["username"] = username
-    return player_stats[user_id]
-
-
-def record_game_result(is_win: bool):
-    lobby_stats["total_games"] += 1
-    if is_win:
-        lobby_stats["wins"] += 1
-    else:
-        lobby_stats["losses"] += 1
-    save_stats()
-
-
-def add_mvp(username: str):
-    user_id = find_player_by_username(username)
-    if not user_id:
-        user_id = f"user_{len(player_stats)+1}"
-        register_player(user_id, username)
-    player_stats[user_id]["mvp_count"] += 1
-    save_stats()
-
-
-def add_lvp(username: str):
-    user_id = find_player_by_username(username)
-    if not user_id:
-        user_id = f"user_{len(player_stats)+1}"
-        register_player(user_id, username)
-
-    player_stats[user_id]["lvp_count"] += 1
-    save_stats()
-
-
-def find_player_by_username(username: str) -> str:
-    username = username.lower().strip("@")
-    for user_id, data in player_stats.items():
-        if data.get("username", "").lower().strip("@") == username:
-            return user_id
-    return None
-
-
-def get_player_display_name(user_id: str) -> str:
-    player = player_stats.get(user_id, {})
+    """Немедленно сохраняет все отложенные изменения"""
+    get_backend().flush()
+
+
+def close_stats():
+    """Останавливает фоновую запись и сохраняет несохранённые изменения"""
+    global _backend
+    if _backend is not None:
+        _backend.close()
+        _backend = None
+
+
+def get_stats_version(chat_id) -> int:
+    return _versions.get(str(chat_id), 0)
+
+
+def _bump_version(chat_id: str):
+    # Увеличиваем после изменения, чтобы кэш не сохранил старые данные с новой версией
+    _versions[chat_id] = _versions.get(chat_id, 0) + 1
+
+
+def register_player(chat_id, user_id: str, username: str):
+    player = get_backend().register_player(str(chat_id), user_id, username)
+    _bump_version(str(chat_id))
+    return player
+
+
+def record_game_result(chat_id, is_win: bool):
+    get_backend().record_game_result(str(chat_id), is_win)
+    _bump_version(str(chat_id))
+
+
+def add_mvp(chat_id, username: str):
+    get_backend().add_award(str(chat_id), "mvp", username)
+    _bump_version(str(chat_id))
+
+
+def add_lvp(chat_id, username: str):
+    get_backend().add_award(str(chat_id), "lvp", username)
+    _bump_version(str(chat_id))
+
+
+def find_player_by_username(chat_id, username: str) -> str:
+    return get_backend().find_player_by_username(str(chat_id), username)
+
+
+def get_player_display_name(chat_id, user_id: str) -> str:
+    player = get_backend().get_player(str(chat_id), user_id) or {}
     return f"@{player['username']}" if player.get("username") else f"Игрок {user_id}"
 
 
-def get_mvp_leaderboard() -> List[Tuple[str, int]]:
-    return sorted(
-        [
-            (data["username"], data["mvp_count"])
-            for data in player_stats.values()
-            if data.get("mvp_count", 0) > 0
-        ],
-        key=lambda x: x[1],
-        reverse=True,
-    )[:10]
+def get_mvp_leaderboard(
+    chat_id, offset: int = 0, limit: int = 10
+) -> List[Tuple[str, int]]:
+    return get_backend().get_leaderboard(str(chat_id), "mvp", offset, limit)
 
 
-def get_lvp_leaderboard() -> List[Tuple[str, int]]:
-    return sorted(
-        [
-            (data["username"], data["lvp_count"])
-            for data in player_stats.values()
-            if data.get("lvp_count", 0) > 0
-        ],
-        key=lambda x: x[1],
-        reverse=True,
-    )[:10]
+def get_lvp_leaderboard(
+    chat_id, offset: int = 0, limit: int = 10
+) -> List[Tuple[str, int]]:
+    return get_backend().get_leaderboard(str(chat_id), "lvp", offset, limit)
 
 
-def get_lobby_stats() -> Dict[str, Any]:
+def _with_winrate(lobby_stats: Dict[str, Any]) -> Dict[str, Any]:
     winrate = (
         (lobby_stats["wins"] / lobby_stats["total_games"] * 100)
         if lobby_stats["total_games"] > 0
@@ -118,4 +120,30 @@ def get_lobby_stats() -> Dict[str, Any]:
     return {**lobby_stats, "winrate": winrate}
 
 
-load_stats()  # type: ignore
+def get_lobby_stats(chat_id) -> Dict[str, Any]:
+    return _with_winrate(get_backend().get_lobby_stats(str(chat_id)))
+
+
+def get_window_stats(chat_id, unit: str, count: int) -> Dict[str, Any]:
+    """Игры, винрейт и топы MVP/LVP за последние count часов ("h") или дней ("d")"""
+    return _with_winrate(get_backend().get_window_stats(str(chat_id), unit, count))
+
+
+def export_stats(chat_id, fmt: str = "ndjson") -> Iterator[bytes]:
+    """Выгрузка игроков чата в NDJSON или CSV кусками байтов"""
+    return stats_export.export_stats(get_backend(), str(chat_id), fmt)
+
+
+def write_export(chat_id, path: str, fmt: str = "ndjson") -> int:
+    """Выгрузка в файл (.gz — со сжатием); возвращает размер файла"""
+    return stats_export.write_export(export_stats(chat_id, fmt), path)
+
+
+def import_stats(chat_id, f: IO[str], fmt: str = "ndjson") -> int:
+    """Заменяет игроков чата данными выгрузки; возвращает их число"""
+    count = stats_export.import_stats(get_backend(), str(chat_id), f, fmt)
+    _bump_version(str(chat_id))
+    return count
+
+
+atexit.register(close_stats)
@@ -0,0 +1,88 @@
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Политика отложенной записи: не позже N секунд или после N изменений
+FLUSH_MAX_DELAY = float(os.getenv("STATS_FLUSH_MAX_DELAY", "2.0"))
+FLUSH_MAX_OPS = int(os.getenv("STATS_FLUSH_MAX_OPS", "50"))
+
+AWARD_KINDS = ("mvp", "lvp")
+
+
+def normalize_username(username: str) -> str:
+    return username.lower().strip("@")
+
+
+class StatsBackend:
+    """Интерфейс хранилища статистики.
+
+    Все методы синхронные и потокобезопасные; из обработчиков бота их
+    вызывают через statistics_data.run_stats, то есть вне event loop.
+    """
+
+    def load_chat(self, chat_id: str):
+        """Подготавливает данные чата (например, загружает их в память)"""
+
+    def record_game_result(self, chat_id: str, is_win: bool):
+        raise NotImplementedError
+
+    def add_award(self, chat_id: str, kind: str, username: str):
+        """Начисляет MVP/LVP игроку по нику, создавая его при необходимости"""
+        raise NotImplementedError
+
+    def register_player(
+        self, chat_id: str, user_id: str, username: str
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def find_player_by_username(self, chat_id: str, username: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_player(self, chat_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_lobby_stats(self, chat_id: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def get_leaderboard(
+        self, chat_id: str, kind: str, offset: int = 0, limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        raise NotImplementedError
+
+    def get_window_stats(
+        self, chat_id: str, unit: str, count: int, limit: int = 10
+    ) -> Dict[str, Any]:
+        """Игры и топ наград за последние count часов ("h") или дней ("d").
+
+        Возвращает total_games, wins, losses и списки (ник, число) mvp и lvp.
+        """
+        raise NotImplementedError
+
+    def iter_players(
+        self, chat_id: str, chunk_size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Игроки чата пачками по chunk_size: поля get_player и user_id.
+
+        Блокировка берётся на каждую пачку отдельно, поэтому выгрузка
+        большого чата не останавливает запись статистики.
+        """
+        raise NotImplementedError
+
+    def import_players(
+        self,
+        chat_id: str,
+        batches: Iterable[List[Dict[str, Any]]],
+        lobby_stats: Optional[Dict[str, int]] = None,
+    ) -> int:
+        """Заменяет игроков чата загруженными пачками и возвращает их число.
+
+        lobby_stats, если передан, заменяет и счётчики игр. Статистика за
+        периоды и история событий чата очищаются: они ссылаются на прежних
+        игроков. Повтор user_id — ValueError; при ошибке данные чата не меняются.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """Немедленно сохраняет все отложенные изменения"""
+
+    def close(self):
+        """Сохраняет изменения и освобождает ресурсы"""
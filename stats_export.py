@@ -0,0 +1,257 @@
+import argparse
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from stats_backend import StatsBackend
+
+# Выгрузка игроков чата для резервных копий и переноса между хранилищами.
+#
+# NDJSON: первая строка — {"version", "chat_id", "lobby_stats"}, дальше по
+# игроку на строку. CSV: только игроки, заголовок из PLAYER_FIELDS.
+# Игроки читаются и пишутся пачками. С хранилищем sqlite память поэтому не
+# зависит от размера чата; хранилище json держит чат в памяти целиком и
+# собирает загруженных игроков в новый ChatStats до замены.
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_VERSION = 1
+PLAYER_FIELDS = ("user_id", "username", "mvp_count", "lvp_count", "first_seen")
+LOBBY_FIELDS = ("total_games", "wins", "losses")
+# Игроков в одной пачке выгрузки и загрузки
+EXPORT_CHUNK_SIZE = int(os.getenv("STATS_EXPORT_CHUNK_SIZE", "5000"))
+
+
+def _json_line(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+def export_ndjson(
+    backend: StatsBackend, chat_id: str, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    header = {
+        "version": EXPORT_VERSION,
+        "chat_id": chat_id,
+        "lobby_stats": backend.get_lobby_stats(chat_id),
+    }
+    yield _json_line(header)
+    for chunk in backend.iter_players(chat_id, chunk_size):
+        yield b"".join(
+            _json_line({field: player.get(field) for field in PLAYER_FIELDS})
+            for player in chunk
+        )
+
+
+def export_csv(
+    backend: StatsBackend, chat_id: str, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PLAYER_FIELDS)
+    for chunk in itertools.chain([[]], backend.iter_players(chat_id, chunk_size)):
+        writer.writerows(
+            [player.get(field) for field in PLAYER_FIELDS] for player in chunk
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def export_stats(
+    backend: StatsBackend,
+    chat_id: str,
+    fmt: str = "ndjson",
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Выгрузка чата кусками байтов: по куску на пачку игроков"""
+    if fmt == "csv":
+        return export_csv(backend, chat_id, chunk_size)
+    if fmt == "ndjson":
+        return export_ndjson(backend, chat_id, chunk_size)
+    raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+
+def write_export(chunks: Iterable[bytes], path: str) -> int:
+    """Пишет выгрузку в файл (.gz — со сжатием) и возвращает его размер"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    return os.path.getsize(path)
+
+
+def _count(value: Any, field: str) -> int:
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"{field} должен быть целым неотрицательным числом")
+    return value
+
+
+def validate_player(record: Any, line: int) -> Dict[str, Any]:
+    """Проверяет запись игрока; ошибка — ValueError с номером строки"""
+    try:
+        if not isinstance(record, dict):
+            raise ValueError("ожидался объект игрока")
+        user_id = record.get("user_id")
+        if isinstance(user_id, int) and not isinstance(user_id, bool):
+            user_id = str(user_id)
+        if not isinstance(user_id, str) or not user_id:
+            raise ValueError("нет user_id")
+        username = record.get("username") or None
+        if username is not None and not isinstance(username, str):
+            raise ValueError("username должен быть строкой")
+        first_seen = record.get("first_seen") or None
+        if isinstance(first_seen, str):
+            if first_seen.isdigit():
+                first_seen = int(first_seen)
+            else:
+                datetime.fromisoformat(first_seen)
+        elif isinstance(first_seen, (int, float)) and not isinstance(first_seen, bool):
+            first_seen = int(first_seen)
+        elif first_seen is not None:
+            raise ValueError("first_seen должен быть датой ISO или секундами")
+        else:
+            # Как при регистрации: игрок впервые встречен сейчас
+            first_seen = int(time.time())
+        return {
+            "user_id": user_id,
+            "username": username,
+            "mvp_count": _count(record.get("mvp_count", 0), "mvp_count"),
+            "lvp_count": _count(record.get("lvp_count", 0), "lvp_count"),
+            "first_seen": first_seen,
+        }
+    except ValueError as e:
+        raise ValueError(f"Строка {line}: {e}") from None
+
+
+def _ndjson_records(f: IO[str]) -> Iterator[Tuple[int, Any]]:
+    for line, text in enumerate(f, 1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError as e:
+            raise ValueError(f"Строка {line}: некорректный JSON ({e})") from None
+
+
+def _csv_records(f: IO[str]) -> Iterator[Tuple[int, Dict[str, str]]]:
+    reader = csv.DictReader(f)
+    if not reader.fieldnames or "user_id" not in reader.fieldnames:
+        raise ValueError(f"В заголовке CSV нет user_id: {reader.fieldnames}")
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_export(
+    f: IO[str], fmt: str = "ndjson"
+) -> Tuple[Optional[Dict[str, int]], Iterator[Dict[str, Any]]]:
+    """(счётчики лобби или None, генератор проверенных игроков)"""
+    if fmt == "csv":
+        records = _csv_records(f)
+        return None, (validate_player(record, line) for line, record in records)
+    if fmt != "ndjson":
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    records = _ndjson_records(f)
+    first = next(records, None)
+    lobby_stats = None
+    if first is not None and isinstance(first[1], dict) and "lobby_stats" in first[1]:
+        line, header = first
+        if header.get("version", EXPORT_VERSION) > EXPORT_VERSION:
+            raise ValueError(f"Выгрузка версии {header['version']} не поддерживается")
+        try:
+            lobby_stats = {
+                field: _count(header["lobby_stats"].get(field, 0), field)
+                for field in LOBBY_FIELDS
+            }
+        except (AttributeError, ValueError) as e:
+            raise ValueError(f"Строка {line}: некорректные lobby_stats ({e})") from None
+        first = None
+    if first is not None:
+        records = itertools.chain([first], records)
+    return lobby_stats, (validate_player(record, line) for line, record in records)
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_stats(
+    backend: StatsBackend,
+    chat_id: str,
+    f: IO[str],
+    fmt: str = "ndjson",
+    batch_size: int = EXPORT_CHUNK_SIZE,
+) -> int:
+    """Заменяет игроков чата данными выгрузки; возвращает число игроков"""
+    lobby_stats, players = read_export(f, fmt)
+    return backend.import_players(chat_id, batched(players, batch_size), lobby_stats)
+
+
+def detect_format(path: str) -> str:
+    name = path[: -len(".gz")] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "ndjson"
+
+
+def _open_text(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def main():
+    """Выгрузка и загрузка игроков чата в NDJSON или CSV"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("action", choices=("export", "import"))
+    parser.add_argument("chat_id")
+    parser.add_argument(
+        "path", help="файл; .gz — со сжатием, «-» — stdout/stdin"
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=EXPORT_FORMATS,
+        help="по умолчанию — по расширению файла",
+    )
+    args = parser.parse_args()
+    fmt = args.format or detect_format(args.path)
+
+    import statistics_data
+
+    try:
+        if args.action == "export":
+            chunks = statistics_data.export_stats(args.chat_id, fmt)
+            if args.path == "-":
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+            else:
+                size = write_export(chunks, args.path)
+                print(f"Чат {args.chat_id}: выгружено в {args.path}, {size} байт")
+        else:
+            if args.path == "-":
+                # stdin не закрываем: он принадлежит процессу
+                count = statistics_data.import_stats(args.chat_id, sys.stdin, fmt)
+            else:
+                with _open_text(args.path, "r") as f:
+                    count = statistics_data.import_stats(args.chat_id, f, fmt)
+            print(f"Чат {args.chat_id}: загружено игроков: {count}")
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        statistics_data.close_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,608 @@
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from leaderboard import Leaderboard
+from metrics import timer
+from stats_backend import (
+    AWARD_KINDS,
+    FLUSH_MAX_DELAY,
+    FLUSH_MAX_OPS,
+    StatsBackend,
+    normalize_username,
+)
+from stats_persistence import (
+    JOURNAL_GENERATIONS,
+    EventJournal,
+    WriteBehindWriter,
+    atomic_write_bytes,
+    atomic_write_json,
+    journal_generation,
+    read_journal,
+)
+from stats_snapshot import SnapshotReader, encode_snapshot
+from stats_windows import WindowedCounters
+
+# Каждый чат хранится отдельно: снапшот stats/<chat_id>.snap (или .json)
+# + журнал stats/<chat_id>.events.log. При записи снапшота журнал начинается
+# заново, а прежний до конца записи лежит в stats/<chat_id>.events.log.1
+STATS_DIR = os.getenv("STATS_DIR", "stats")
+# Формат снапшота: binary — компактный, читается через mmap; json — текстовый.
+# Снапшот в другом формате читается и при следующей записи заменяется
+SNAPSHOT_FORMAT = os.getenv("STATS_SNAPSHOT_FORMAT", "binary")
+
+# Общий файл статистики из версий без разбиения по чатам
+LEGACY_STATS_FILE = "group_stats.json"
+LEGACY_EVENTS_FILE = "group_events.log"
+# Чат, в который переносится общий файл при первом обращении
+LEGACY_CHAT_ID = os.getenv("STATS_LEGACY_CHAT_ID")
+
+# Через сколько событий журнал сворачивается в снапшот
+SNAPSHOT_EVERY = int(os.getenv("STATS_SNAPSHOT_EVERY", "1000"))
+# Сколько чатов держать в памяти, остальные выгружаются по LRU
+MAX_RESIDENT_CHATS = int(os.getenv("STATS_MAX_RESIDENT_CHATS", "100"))
+
+
+class PlayerRecord:
+    """Игрок чата в компактном виде.
+
+    __slots__ вместо словаря со строковыми ключами, ник интернирован,
+    first_seen — целые секунды эпохи вместо ISO-строки. В снапшот и наружу
+    игрок отдаётся словарём прежнего вида.
+    """
+
+    __slots__ = ("username", "mvp_count", "lvp_count", "first_seen")
+
+    def __init__(
+        self,
+        username: str,
+        mvp_count: int = 0,
+        lvp_count: int = 0,
+        first_seen: int = 0,
+    ):
+        self.username = sys.intern(username) if username else username
+        self.mvp_count = mvp_count
+        self.lvp_count = lvp_count
+        self.first_seen = first_seen
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PlayerRecord":
+        first_seen = data.get("first_seen") or 0
+        if isinstance(first_seen, str):
+            # Снапшоты прежних версий хранили ISO-строку
+            first_seen = int(datetime.fromisoformat(first_seen).timestamp())
+        return cls(
+            data.get("username"),
+            data.get("mvp_count", 0),
+            data.get("lvp_count", 0),
+            first_seen,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Запись для снапшота"""
+        return {
+            "mvp_count": self.mvp_count,
+            "lvp_count": self.lvp_count,
+            "username": self.username,
+            "first_seen": self.first_seen,
+        }
+
+    def to_public(self) -> Dict[str, Any]:
+        """Словарь, который возвращает хранилище: first_seen — ISO-строка"""
+        data = self.to_dict()
+        data["first_seen"] = datetime.fromtimestamp(self.first_seen).isoformat()
+        return data
+
+
+class ChatStats:
+    """Статистика одного чата: счётчики в памяти и журнал событий на диске"""
+
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        self.stats_file = os.path.join(STATS_DIR, f"{chat_id}.json")
+        self.snapshot_file = os.path.join(STATS_DIR, f"{chat_id}.snap")
+        self.events_file = os.path.join(STATS_DIR, f"{chat_id}.events.log")
+        self.archive_file = self.events_file + ".1"
+
+        self.lobby_stats = {"total_games": 0, "wins": 0, "losses": 0}
+        self.player_stats = {}  # {user_id: PlayerRecord}
+        self.username_index = {}  # {нормализованный ник: user_id}
+        self.next_player_num = 1
+        self.leaderboards = {kind: Leaderboard() for kind in AWARD_KINDS}
+        self.windows = WindowedCounters()
+
+        self.journal = None
+        self.journal_generation = 0
+        self.events_since_snapshot = 0
+        self.closed = False
+
+    def load(self):
+        """Загружает последний снапшот и доигрывает хвост журнала событий"""
+        snapshot_file, events_file = self._find_snapshot(), self.events_file
+        # Переписать ли данные в снапшот чата сразу после загрузки
+        migrate = snapshot_file not in (None, self._snapshot_path())
+        if (
+            str(self.chat_id) == LEGACY_CHAT_ID
+            and snapshot_file is None
+            and not os.path.exists(events_file)
+        ):
+            snapshot_file, events_file = LEGACY_STATS_FILE, LEGACY_EVENTS_FILE
+            migrate = True
+
+        generation, journal_offset = 0, 0
+        if snapshot_file is not None and os.path.exists(snapshot_file):
+            try:
+                if snapshot_file == self.snapshot_file:
+                    generation, journal_offset = self._load_binary(snapshot_file)
+                else:
+                    generation, journal_offset = self._load_json(snapshot_file)
+            except Exception as e:
+                print(f"Ошибка загрузки: {e}")
+        # В двоичном снапшоте next_player_num есть всегда, сверять его
+        # с номерами игроков не нужно
+        self.rebuild_index(reserve_ids=snapshot_file != self.snapshot_file)
+        self.rebuild_leaderboards()
+
+        journals = [(events_file, journal_offset)]
+        if events_file == self.events_file:
+            archived = journal_generation(self.archive_file)
+            if archived == generation:
+                # Запись снапшота прервалась после ротации: снапшот указывает
+                # в прежний журнал, новый доигрывается целиком
+                journals = [(self.archive_file, journal_offset), (events_file, 0)]
+                generation = (generation + 1) % JOURNAL_GENERATIONS
+            else:
+                if archived is not None:
+                    # Снапшот записан, а архив не успели удалить
+                    os.remove(self.archive_file)
+                if journal_generation(events_file) not in (None, generation):
+                    print(f"Журнал {events_file} не от этого снапшота, доигрывается целиком")
+                    journals = [(events_file, 0)]
+        for path, offset in journals:
+            for event in read_journal(path, offset):
+                self.apply_event(event)
+                self.events_since_snapshot += 1
+
+        os.makedirs(STATS_DIR, exist_ok=True)
+        current = journal_generation(self.events_file)
+        self.journal_generation = generation if current is None else current
+        self.journal = EventJournal(self.events_file, self.journal_generation)
+        if migrate:
+            # Перенесённые данные и снапшот в другом формате сразу сохраняем
+            # в файл чата нужного формата
+            self.write_snapshot(*self.dump())
+            self.events_since_snapshot = 0
+
+    def _find_snapshot(self) -> Optional[str]:
+        # Оба файла остаются, только если запись прервалась между заменой
+        # снапшота и удалением старого — тогда актуален более свежий
+        existing = [
+            path
+            for path in (self.snapshot_file, self.stats_file)
+            if os.path.exists(path)
+        ]
+        return max(existing, key=os.path.getmtime, default=None)
+
+    def _load_json(self, path: str) -> Tuple[int, int]:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.lobby_stats = data.get(
+            "lobby_stats", {"total_games": 0, "wins": 0, "losses": 0}
+        )
+        self.player_stats = {
+            user_id: PlayerRecord.from_dict(player)
+            for user_id, player in data.get("player_stats", {}).items()
+        }
+        self.next_player_num = data.get("next_player_num", 1)
+        self.windows.load_dict(data.get("windows", {}))
+        return data.get("journal_generation", 0), data.get("journal_offset", 0)
+
+    def _load_binary(self, path: str) -> Tuple[int, int]:
+        with SnapshotReader(path) as reader:
+            # Игроки разбираются все сразу: индекс ников и топы MVP/LVP
+            # строятся по каждому из них. mmap избавляет от разбора JSON и
+            # копии файла в памяти, но не от декодирования строк
+            self.lobby_stats = reader.lobby_stats
+            self.player_stats = {
+                user_id: PlayerRecord(username, mvp_count, lvp_count, first_seen)
+                for user_id, username, mvp_count, lvp_count, first_seen in (
+                    reader.players()
+                )
+            }
+            self.next_player_num = reader.next_player_num
+            self.windows.load_dict(reader.windows())
+            return reader.journal_generation, reader.journal_offset
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "lobby_stats": dict(self.lobby_stats),
+            "player_stats": {
+                user_id: player.to_dict()
+                for user_id, player in self.player_stats.items()
+            },
+            "journal_generation": self.journal_generation,
+            "journal_offset": self.journal.offset(),
+            "next_player_num": self.next_player_num,
+            "windows": self.windows.to_dict(),
+        }
+
+    def _snapshot_path(self) -> str:
+        return self.stats_file if SNAPSHOT_FORMAT == "json" else self.snapshot_file
+
+    def dump(self) -> Tuple[str, Any]:
+        """Снапшот в формате STATS_SNAPSHOT_FORMAT: (путь, данные для записи)"""
+        if SNAPSHOT_FORMAT == "json":
+            return self.stats_file, self.snapshot()
+        data = encode_snapshot(
+            self.lobby_stats,
+            (
+                (user_id, p.username, p.mvp_count, p.lvp_count, p.first_seen)
+                for user_id, p in self.player_stats.items()
+            ),
+            self.journal.offset(),
+            self.next_player_num,
+            self.windows.to_dict(),
+            self.journal_generation,
+        )
+        return self.snapshot_file, data
+
+    def write_snapshot(self, path: str, data: Any):
+        """Записывает результат dump() и удаляет снапшот в другом формате"""
+        if isinstance(data, bytes):
+            atomic_write_bytes(path, data)
+            stale = self.stats_file
+        else:
+            atomic_write_json(path, data)
+            stale = self.snapshot_file
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def rotate_journal(self) -> bool:
+        """Начинает новый журнал; прежний остаётся архивом до записи снапшота.
+
+        Архив от прошлой ротации означает, что тот снапшот не записан и
+        ещё указывает в архив, — тогда журнал продолжается без ротации.
+        """
+        if os.path.exists(self.archive_file):
+            return False
+        self.journal.close()
+        os.replace(self.events_file, self.archive_file)
+        self.journal_generation = (self.journal_generation + 1) % JOURNAL_GENERATIONS
+        self.journal = EventJournal(self.events_file, self.journal_generation)
+        return True
+
+    def rebuild_index(self, reserve_ids: bool = True):
+        self.username_index = {}
+        for user_id, player in self.player_stats.items():
+            if reserve_ids:
+                self._reserve_player_id(user_id)
+            if player.username:
+                self.username_index.setdefault(
+                    normalize_username(player.username), user_id
+                )
+
+    def rebuild_leaderboards(self):
+        for kind, board in self.leaderboards.items():
+            board.rebuild(
+                (user_id, getattr(player, f"{kind}_count"), player.username)
+                for user_id, player in self.player_stats.items()
+            )
+
+    def _update_leaderboards(self, user_id: str):
+        player = self.player_stats[user_id]
+        for kind, board in self.leaderboards.items():
+            board.update(user_id, getattr(player, f"{kind}_count"), player.username)
+
+    def _reserve_player_id(self, user_id: str):
+        prefix, _, num = user_id.partition("_")
+        if prefix == "user" and num.isdigit():
+            self.next_player_num = max(self.next_player_num, int(num) + 1)
+
+    def register_player(
+        self, user_id: str, username: str, first_seen: float = None
+    ) -> PlayerRecord:
+        player = self.player_stats.get(user_id)
+        if player is None:
+            player = self.player_stats[user_id] = PlayerRecord(
+                username, first_seen=int(first_seen or time.time())
+            )
+            self._reserve_player_id(user_id)
+            if username:
+                self.username_index.setdefault(normalize_username(username), user_id)
+        elif username and player.username != username:
+            old_key = normalize_username(player.username or "")
+            if self.username_index.get(old_key) == user_id:
+                del self.username_index[old_key]
+            player.username = sys.intern(username)
+            self.username_index.setdefault(normalize_username(username), user_id)
+            self._update_leaderboards(user_id)
+        return player
+
+    def apply_event(self, event: Dict[str, Any]):
+        """Применяет событие к счётчикам — и при записи, и при доигрывании журнала"""
+        kind = event["type"]
+        if kind == "win":
+            self.lobby_stats["total_games"] += 1
+            self.lobby_stats["wins"] += 1
+            self.windows.add(event["ts"], "wins")
+        elif kind == "loss":
+            self.lobby_stats["total_games"] += 1
+            self.lobby_stats["losses"] += 1
+            self.windows.add(event["ts"], "losses")
+        elif kind in AWARD_KINDS:
+            if event["user_id"] not in self.player_stats:
+                self.register_player(event["user_id"], event["username"], event["ts"])
+            player = self.player_stats[event["user_id"]]
+            count = getattr(player, f"{kind}_count") + 1
+            setattr(player, f"{kind}_count", count)
+            self.leaderboards[kind].update(event["user_id"], count, player.username)
+            self.windows.add(event["ts"], kind, event["user_id"])
+        elif kind == "player":
+            self.register_player(event["user_id"], event["username"], event["ts"])
+
+    def find_player_by_username(self, username: str) -> str:
+        return self.username_index.get(normalize_username(username))
+
+    def new_player_id(self) -> str:
+        # Номера не переиспользуются, поэтому не совпадают с существующими id
+        while f"user_{self.next_player_num}" in self.player_stats:
+            self.next_player_num += 1
+        user_id = f"user_{self.next_player_num}"
+        self.next_player_num += 1
+        return user_id
+
+
+class JsonStatsBackend(StatsBackend):
+    """Хранилище на файлах: снапшот + журнал событий на каждый чат.
+
+    Данные чата загружаются в память при первом обращении, давно
+    неиспользуемые чаты выгружаются по LRU.
+    """
+
+    def __init__(self):
+        # Защищает реестр чатов и их данные от чтения потоком записи
+        self._lock = threading.RLock()
+        self._shards = OrderedDict()  # {chat_id: ChatStats}, от старых к свежим
+        self._dirty = set()  # чаты с несброшенными событиями
+        self._writer = None
+        self._snapshot_write_lock = threading.Lock()
+
+    def load_chat(self, chat_id: str) -> ChatStats:
+        """Возвращает статистику чата, загружая её с диска при первом обращении"""
+        chat_id = str(chat_id)
+        with self._lock:
+            shard = self._shards.get(chat_id)
+            if shard is not None:
+                self._shards.move_to_end(chat_id)
+                return shard
+            shard = ChatStats(chat_id)
+            with timer("load_stats"):
+                shard.load()
+            self._shards[chat_id] = shard
+            if shard.events_since_snapshot:
+                self._mark_dirty(chat_id)
+            while len(self._shards) > MAX_RESIDENT_CHATS:
+                self._evict(next(iter(self._shards)))
+            return shard
+
+    def _evict(self, chat_id: str):
+        # Снапшот не нужен: журнал сброшен на диск и будет доигран при загрузке
+        shard = self._shards.pop(chat_id)
+        shard.closed = True
+        shard.journal.close()
+
+    def _compact(self, shard: ChatStats):
+        """Сворачивает журнал чата в снапшот счётчиков и начинает новый журнал"""
+        # Снапшоты пишутся по одному и в порядке снятия: на диске всегда
+        # снапшот текущего или прежнего журнала, поэтому архив хватает одного
+        with self._snapshot_write_lock:
+            with self._lock:
+                if shard.closed:
+                    return
+                path, data = self._start_snapshot(shard)
+            self._finish_snapshot(shard, path, data)
+
+    def _start_snapshot(self, shard: ChatStats) -> Tuple[str, Any]:
+        # Вызывается под _lock: ротация и снимок данных атомарны для записи событий
+        shard.rotate_journal()
+        path, data = shard.dump()
+        shard.events_since_snapshot = 0
+        return path, data
+
+    def _finish_snapshot(self, shard: ChatStats, path: str, data: Any):
+        shard.journal.sync()
+        with timer("save_stats"):
+            shard.write_snapshot(path, data)
+        if os.path.exists(shard.archive_file):
+            os.remove(shard.archive_file)
+
+    def compact(self):
+        """Сворачивает журналы всех загруженных чатов в снапшоты"""
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            if shard.events_since_snapshot:
+                self._compact(shard)
+
+    def _flush_dirty(self):
+        with self._lock:
+            shards = [
+                self._shards[chat_id]
+                for chat_id in self._dirty
+                if chat_id in self._shards
+            ]
+            self._dirty.clear()
+        for shard in shards:
+            shard.journal.sync()
+            if shard.events_since_snapshot >= SNAPSHOT_EVERY:
+                self._compact(shard)
+
+    def _mark_dirty(self, chat_id: str):
+        with self._lock:
+            self._dirty.add(chat_id)
+            if self._writer is None:
+                self._writer = WriteBehindWriter(
+                    self._flush_dirty,
+                    max_delay=FLUSH_MAX_DELAY,
+                    max_ops=FLUSH_MAX_OPS,
+                )
+        self._writer.mark_dirty()
+
+    def flush(self):
+        """Немедленно сбрасывает журналы и записывает снапшоты"""
+        if self._writer is not None:
+            self._writer.flush()
+        self.compact()
+
+    def close(self):
+        """Останавливает фоновую запись, сворачивает журналы и выгружает чаты"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self.compact()
+        with self._lock:
+            while self._shards:
+                self._evict(next(iter(self._shards)))
+
+    def _record_event(self, chat_id: str, event: Dict[str, Any]):
+        event["ts"] = int(time.time())
+        with self._lock:
+            shard = self.load_chat(chat_id)
+            if event["type"] in AWARD_KINDS:
+                event["user_id"] = shard.find_player_by_username(event["username"])
+                if not event["user_id"]:
+                    event["user_id"] = shard.new_player_id()
+            shard.apply_event(event)
+            shard.journal.append(event)
+            shard.events_since_snapshot += 1
+            self._mark_dirty(shard.chat_id)
+
+    def record_game_result(self, chat_id: str, is_win: bool):
+        self._record_event(chat_id, {"type": "win" if is_win else "loss"})
+
+    def add_award(self, chat_id: str, kind: str, username: str):
+        self._record_event(chat_id, {"type": kind, "username": username})
+
+    def register_player(
+        self, chat_id: str, user_id: str, username: str
+    ) -> Dict[str, Any]:
+        with self._lock:
+            player = self.load_chat(chat_id).player_stats.get(user_id)
+            if player is None or (username and player.username != username):
+                # Новый игрок или смена ника тоже попадают в журнал
+                self._record_event(
+                    chat_id,
+                    {"type": "player", "user_id": user_id, "username": username},
+                )
+            return self.load_chat(chat_id).player_stats[user_id].to_public()
+
+    def find_player_by_username(self, chat_id: str, username: str) -> Optional[str]:
+        with self._lock:
+            return self.load_chat(chat_id).find_player_by_username(username)
+
+    def get_player(self, chat_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            player = self.load_chat(chat_id).player_stats.get(user_id)
+            return player.to_public() if player is not None else None
+
+    def get_lobby_stats(self, chat_id: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.load_chat(chat_id).lobby_stats)
+
+    def get_leaderboard(
+        self, chat_id: str, kind: str, offset: int = 0, limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self.load_chat(chat_id).leaderboards[kind].top(offset, limit)
+
+    def get_window_stats(
+        self, chat_id: str, unit: str, count: int, limit: int = 10
+    ) -> Dict[str, Any]:
+        with self._lock:
+            shard = self.load_chat(chat_id)
+            totals = shard.windows.query(unit, count, time.time())
+            result = {
+                "total_games": totals["wins"] + totals["losses"],
+                "wins": totals["wins"],
+                "losses": totals["losses"],
+            }
+            # Корзины из снапшотов, записанных при импорте до их очистки,
+            # могут ссылаться на удалённых игроков — таких пропускаем
+            names = {
+                user_id: shard.player_stats[user_id].username
+                for kind in AWARD_KINDS
+                for user_id in totals[kind]
+                if user_id in shard.player_stats
+            }
+            for kind in AWARD_KINDS:
+                # Порядок тот же, что у Leaderboard: очки, ник, user_id
+                top = heapq.nsmallest(
+                    limit,
+                    (
+                        (-n, (names[user_id] or "").lower(), user_id)
+                        for user_id, n in totals[kind].items()
+                        if user_id in names
+                    ),
+                )
+                result[kind] = [(names[user_id], -n) for n, _, user_id in top]
+            return result
+
+    def iter_players(
+        self, chat_id: str, chunk_size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        with self._lock:
+            # Только ссылки на ключи; игроки не удаляются, поэтому пачки
+            # выбираются по этому списку в порядке добавления
+            user_ids = list(self.load_chat(chat_id).player_stats)
+        for start in range(0, len(user_ids), chunk_size):
+            with self._lock:
+                players = self.load_chat(chat_id).player_stats
+                chunk = [
+                    {"user_id": user_id, **players[user_id].to_public()}
+                    for user_id in user_ids[start : start + chunk_size]
+                    if user_id in players
+                ]
+            yield chunk
+
+    def import_players(
+        self,
+        chat_id: str,
+        batches: Iterable[List[Dict[str, Any]]],
+        lobby_stats: Optional[Dict[str, int]] = None,
+    ) -> int:
+        chat_id = str(chat_id)
+        # Новые данные собираются вне блокировки: бот в это время работает
+        imported = ChatStats(chat_id)
+        for batch in batches:
+            for player in batch:
+                user_id = player["user_id"]
+                if user_id in imported.player_stats:
+                    raise ValueError(f"Повторяется user_id {user_id}")
+                imported.player_stats[user_id] = PlayerRecord.from_dict(player)
+        imported.rebuild_index()
+        imported.rebuild_leaderboards()
+        with self._snapshot_write_lock, self._lock:
+            shard = self.load_chat(chat_id)
+            shard.player_stats = imported.player_stats
+            shard.username_index = imported.username_index
+            shard.leaderboards = imported.leaderboards
+            # Корзины за периоды ссылаются на прежних игроков: начинаются заново
+            shard.windows = imported.windows
+            shard.next_player_num = max(
+                shard.next_player_num, imported.next_player_num
+            )
+            if lobby_stats is not None:
+                shard.lobby_stats = {
+                    key: lobby_stats.get(key, 0)
+                    for key in ("total_games", "wins", "losses")
+                }
+            # Импорт не попадает в журнал, поэтому снапшот пишется до снятия
+            # блокировки: выгруженный раньше записи чат потерял бы новые данные
+            self._finish_snapshot(shard, *self._start_snapshot(shard))
+        return len(imported.player_stats)
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from metrics import timed
+
+
+def atomic_write_json(path: str, data: Dict[str, Any]):
+    """Атомарно записывает JSON: временный файл + rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_bytes(path: str, data: bytes):
+    """Атомарно записывает двоичный файл: временный файл + rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Номер поколения журнала хранится в снапшоте в 16 битах и идёт по кругу
+JOURNAL_GENERATIONS = 0x10000
+
+
+class EventJournal:
+    """Журнал событий: одна компактная JSON-строка на событие, только дозапись.
+
+    Новый журнал начинается строкой-заголовком с номером поколения: по нему
+    снапшот отличает текущий журнал от предыдущего после ротации.
+    """
+
+    def __init__(self, path: str, generation: int = 0):
+        self.path = path
+        self.generation = generation
+        self._file = open(path, "ab")
+        self._lock = threading.Lock()
+        if self._file.tell() == 0:
+            self.append({"type": "journal", "generation": generation})
+
+    def append(self, event: Dict[str, Any]) -> int:
+        """Дописывает событие в буфер и возвращает смещение конца журнала"""
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line.encode("utf-8") + b"\n")
+            return self._file.tell()
+
+    def offset(self) -> int:
+        with self._lock:
+            return self._file.tell()
+
+    def sync(self):
+        """Сбрасывает буфер и делает fsync — один на пачку событий"""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def read_journal(path: str, offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """Читает события начиная со смещения.
+
+    Недописанная последняя строка (например, после падения) отбрасывается
+    и обрезается, чтобы следующие события писались с чистой строки.
+    """
+    if not os.path.exists(path):
+        return
+    good_offset = offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break
+            good_offset += len(line)
+            if event.get("type") != "journal":
+                yield event
+    if os.path.getsize(path) > good_offset:
+        print(f"Журнал {path} обрезан до {good_offset} байт")
+        with open(path, "r+b") as f:
+            f.truncate(good_offset)
+
+
+def journal_generation(path: str) -> Optional[int]:
+    """Поколение журнала из заголовка; None — журнала нет, 0 — журнал без заголовка"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        line = f.readline()
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return 0
+    if isinstance(event, dict) and event.get("type") == "journal":
+        return event.get("generation", 0)
+    return 0
+
+
+class WriteBehindWriter:
+    """Отложенная запись в фоновом потоке.
+
+    Изменения только помечают состояние «грязным», а поток объединяет их
+    в один вызов flush: не позже max_delay секунд после первого изменения
+    или сразу после max_ops изменений.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[], None],
+        max_delay: float = 2.0,
+        max_ops: int = 50,
+    ):
+        self._flush = timed("stats_flush")(flush)
+        self.max_delay = max_delay
+        self.max_ops = max_ops
+
+        self._cond = threading.Condition()
+        self._pending_ops = 0
+        self._dirty_since = None
+        self._closed = False
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="stats-writer", daemon=True
+        )
+        self._thread.start()
+
+    def mark_dirty(self):
+        with self._cond:
+            self._pending_ops += 1
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            if self._pending_ops == 1 or self._pending_ops >= self.max_ops:
+                self._cond.notify()
+
+    def _take_pending(self) -> bool:
+        with self._cond:
+            had_pending = self._pending_ops > 0
+            self._pending_ops = 0
+            self._dirty_since = None
+            return had_pending
+
+    def flush(self, force: bool = False):
+        """Синхронно записывает накопленные изменения"""
+        if self._take_pending() or force:
+            with self._flush_lock:
+                self._flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._pending_ops == 0:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                while not self._closed and self._pending_ops < self.max_ops:
+                    remaining = self._dirty_since + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Ошибка сохранения: {e}")
+
+    def close(self):
+        """Останавливает поток и гарантированно записывает остаток"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
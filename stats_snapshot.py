@@ -0,0 +1,137 @@
+import json
+import mmap
+import struct
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+# Бинарный снапшот чата, версия 1 (все числа little-endian):
+#
+#   заголовок  HEADER: сигнатура, версия, поколение журнала, total_games,
+#              wins, losses, journal_offset, next_player_num, число игроков,
+#              длина windows
+#   игроки     ROW на каждого: mvp, lvp, first_seen, длины user_id и ника
+#   строки     user_id и ники игроков подряд в UTF-8, в порядке строк ROW
+#   windows    JSON корзин статистики за периоды
+#
+# Строки фиксированной длины читаются struct.iter_unpack прямо из mmap,
+# без разбора текста и без копирования файла в память целиком. Декодируются
+# они при загрузке чата все: игроки нужны индексу ников и топам целиком.
+MAGIC = b"RSNP"
+VERSION = 1
+# Поколение журнала занимает бывшие байты выравнивания: в ранних файлах
+# там нули, то есть поколение 0
+HEADER = struct.Struct("<4sHHqqqqqII")
+ROW = struct.Struct("<IIqHH")
+# Длина ника, означающая «ника нет»
+NO_USERNAME = 0xFFFF
+
+
+class SnapshotError(Exception):
+    """Файл не является снапшотом поддерживаемой версии"""
+
+
+def encode_snapshot(
+    lobby_stats: Dict[str, int],
+    players: Iterable[Tuple[str, Optional[str], int, int, int]],
+    journal_offset: int,
+    next_player_num: int,
+    windows: Dict[str, Any],
+    journal_generation: int = 0,
+) -> bytes:
+    """players: (user_id, ник, mvp, lvp, first_seen)"""
+    rows = []
+    strings = []
+    for user_id, username, mvp_count, lvp_count, first_seen in players:
+        user_id_bytes = user_id.encode("utf-8")
+        username_bytes = username.encode("utf-8") if username is not None else b""
+        rows.append(
+            ROW.pack(
+                mvp_count,
+                lvp_count,
+                first_seen,
+                len(user_id_bytes),
+                len(username_bytes) if username is not None else NO_USERNAME,
+            )
+        )
+        strings.append(user_id_bytes)
+        strings.append(username_bytes)
+    windows_bytes = json.dumps(windows, separators=(",", ":")).encode("utf-8")
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        journal_generation,
+        lobby_stats.get("total_games", 0),
+        lobby_stats.get("wins", 0),
+        lobby_stats.get("losses", 0),
+        journal_offset,
+        next_player_num,
+        len(rows),
+        len(windows_bytes),
+    )
+    return b"".join([header, *rows, *strings, windows_bytes])
+
+
+class SnapshotReader:
+    """Снапшот, отображённый в память.
+
+    Заголовок разбирается сразу, игроки и корзины — только при обращении
+    к players() и windows().
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise SnapshotError(f"{path}: файл короче заголовка")
+        (
+            magic,
+            version,
+            self.journal_generation,
+            total_games,
+            wins,
+            losses,
+            self.journal_offset,
+            self.next_player_num,
+            self.player_count,
+            self._windows_size,
+        ) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise SnapshotError(f"{path}: неизвестный формат или версия {version}")
+        self.lobby_stats = {"total_games": total_games, "wins": wins, "losses": losses}
+        self._rows_end = HEADER.size + self.player_count * ROW.size
+
+    def players(self) -> Iterator[Tuple[str, Optional[str], int, int, int]]:
+        """(user_id, ник, mvp, lvp, first_seen) в порядке записи"""
+        view = memoryview(self._mmap)
+        try:
+            position = self._rows_end
+            for mvp_count, lvp_count, first_seen, user_id_size, username_size in (
+                ROW.iter_unpack(view[HEADER.size : self._rows_end])
+            ):
+                user_id = str(view[position : position + user_id_size], "utf-8")
+                position += user_id_size
+                if username_size == NO_USERNAME:
+                    username = None
+                else:
+                    username = str(view[position : position + username_size], "utf-8")
+                    position += username_size
+                yield user_id, username, mvp_count, lvp_count, first_seen
+        finally:
+            view.release()
+
+    def windows(self) -> Dict[str, Any]:
+        """Корзины статистики за периоды; читаются с конца файла"""
+        if not self._windows_size:
+            return {}
+        end = len(self._mmap)
+        return json.loads(self._mmap[end - self._windows_size : end])
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,636 @@
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import timer
+from stats_backend import (
+    AWARD_KINDS,
+    FLUSH_MAX_DELAY,
+    FLUSH_MAX_OPS,
+    StatsBackend,
+    normalize_username,
+)
+from stats_persistence import WriteBehindWriter, read_journal
+from stats_windows import RETENTION, UNIT_SECONDS, bucket_of
+
+STATS_DB_FILE = os.getenv("STATS_DB_FILE", "stats.db")
+# База общая для нескольких процессов (BOT_WORKERS): каждое изменение
+# фиксируется сразу, иначе открытая транзакция держит блокировку записи
+# до фоновой фиксации и остальные процессы получают «database is locked»
+STATS_DB_SHARED = os.getenv("STATS_DB_SHARED", "0") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lobby (
+    chat_id TEXT PRIMARY KEY,
+    total_games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    next_player_num INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS players (
+    chat_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    username TEXT,
+    username_key TEXT,
+    mvp_count INTEGER NOT NULL DEFAULT 0,
+    lvp_count INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT,
+    PRIMARY KEY (chat_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS players_username
+    ON players (chat_id, username_key);
+CREATE INDEX IF NOT EXISTS players_mvp
+    ON players (chat_id, mvp_count DESC, username_key, user_id);
+CREATE INDEX IF NOT EXISTS players_lvp
+    ON players (chat_id, lvp_count DESC, username_key, user_id);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    user_id TEXT,
+    username TEXT
+);
+CREATE TABLE IF NOT EXISTS lobby_buckets (
+    chat_id TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, unit, bucket)
+);
+CREATE TABLE IF NOT EXISTS player_buckets (
+    chat_id TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    mvp_count INTEGER NOT NULL DEFAULT 0,
+    lvp_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (chat_id, unit, bucket, user_id)
+);
+"""
+
+# Имена столбцов подставляются только из AWARD_KINDS, не из ввода пользователя
+LEADERBOARD_SQL = {
+    kind: f"SELECT username, {kind}_count FROM players "
+    f"WHERE chat_id = ? AND {kind}_count > 0 "
+    f"ORDER BY {kind}_count DESC, username_key, user_id LIMIT ? OFFSET ?"
+    for kind in AWARD_KINDS
+}
+AWARD_SQL = {
+    kind: f"UPDATE players SET {kind}_count = {kind}_count + 1 "
+    "WHERE chat_id = ? AND user_id = ?"
+    for kind in AWARD_KINDS
+}
+LOBBY_BUCKET_SQL = {
+    column: "INSERT INTO lobby_buckets (chat_id, unit, bucket, "
+    f"{column}) VALUES (?, ?, ?, 1) ON CONFLICT (chat_id, unit, bucket) "
+    f"DO UPDATE SET {column} = {column} + 1"
+    for column in ("wins", "losses")
+}
+AWARD_BUCKET_SQL = {
+    kind: "INSERT INTO player_buckets (chat_id, unit, bucket, user_id, "
+    f"{kind}_count) VALUES (?, ?, ?, ?, 1) "
+    "ON CONFLICT (chat_id, unit, bucket, user_id) "
+    f"DO UPDATE SET {kind}_count = {kind}_count + 1"
+    for kind in AWARD_KINDS
+}
+WINDOW_TOP_SQL = {
+    kind: f"SELECT p.username, SUM(b.{kind}_count) AS n FROM player_buckets b "
+    "JOIN players p ON p.chat_id = b.chat_id AND p.user_id = b.user_id "
+    "WHERE b.chat_id = ? AND b.unit = ? AND b.bucket > ? "
+    "GROUP BY b.user_id HAVING n > 0 "
+    "ORDER BY n DESC, p.username_key, b.user_id LIMIT ?"
+    for kind in AWARD_KINDS
+}
+
+
+def _first_seen_iso(value: Any) -> Optional[str]:
+    # В JSON-снапшотах first_seen — секунды эпохи, в базе — ISO-строка
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value).isoformat()
+    return value
+
+
+INSERT_PLAYER_SQL = (
+    "INSERT INTO players (chat_id, user_id, username, username_key, "
+    "mvp_count, lvp_count, first_seen) VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _player_row(chat_id: str, user_id: str, player: Dict[str, Any]) -> tuple:
+    return (
+        chat_id,
+        user_id,
+        player.get("username"),
+        normalize_username(player.get("username") or ""),
+        player.get("mvp_count", 0),
+        player.get("lvp_count", 0),
+        _first_seen_iso(player.get("first_seen")),
+    )
+
+
+PLAYER_COLUMNS = (
+    "chat_id, user_id, username, username_key, mvp_count, lvp_count, first_seen"
+)
+# Временная база загрузки: повтор user_id отсекает первичный ключ
+STAGING_SCHEMA = (
+    "CREATE TABLE players (chat_id TEXT, user_id TEXT PRIMARY KEY, "
+    "username TEXT, username_key TEXT, mvp_count INTEGER, lvp_count INTEGER, "
+    "first_seen TEXT)"
+)
+
+
+def _stage_players(
+    path: str, chat_id: str, batches: Iterable[List[Dict[str, Any]]]
+) -> int:
+    """Складывает загружаемых игроков в отдельную базу и возвращает их число"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute(STAGING_SCHEMA)
+        count = 0
+        with conn:
+            for batch in batches:
+                conn.executemany(
+                    INSERT_PLAYER_SQL,
+                    (_player_row(chat_id, player["user_id"], player) for player in batch),
+                )
+                count += len(batch)
+        return count
+    except sqlite3.IntegrityError as e:
+        raise ValueError(f"Повторяется user_id: {e}") from e
+    finally:
+        conn.close()
+
+
+class SqliteStatsBackend(StatsBackend):
+    """Хранилище в SQLite: WAL-журнал, индексы по нику и счётчикам.
+
+    Изменения копятся в открытой транзакции и фиксируются фоновым потоком
+    одной пачкой по той же политике, что и запись JSON. Если базу делят
+    несколько процессов (shared), каждое изменение фиксируется сразу.
+    """
+
+    def __init__(self, path: str = STATS_DB_FILE, shared: bool = STATS_DB_SHARED):
+        self.path = path
+        self.shared = shared
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        has_buckets = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'lobby_buckets'"
+        ).fetchone()
+        self._conn.executescript(SCHEMA)
+        # Последняя корзина, после которой чистились старые: {(chat_id, unit): номер}
+        self._pruned = {}
+        # Чаты, к которым уже обращались: их страницы в кэше SQLite
+        self._loaded = set()
+        if not has_buckets:
+            # База из версии без корзин: заполняем их из истории событий
+            for (chat_id,) in self._conn.execute(
+                "SELECT DISTINCT chat_id FROM events"
+            ).fetchall():
+                self._rebuild_buckets(chat_id)
+            self._conn.commit()
+        self._writer = WriteBehindWriter(
+            self._commit, max_delay=FLUSH_MAX_DELAY, max_ops=FLUSH_MAX_OPS
+        )
+
+    def _commit(self):
+        with self._lock, timer("save_stats"):
+            self._conn.commit()
+
+    def _changed(self):
+        if self.shared:
+            self._commit()
+        else:
+            self._writer.mark_dirty()
+
+    def load_chat(self, chat_id: str):
+        """Первое обращение к чату читает его лобби и топ с диска"""
+        chat_id = str(chat_id)
+        if chat_id in self._loaded:
+            return
+        with self._lock, timer("load_stats"):
+            self._conn.execute(
+                "SELECT total_games FROM lobby WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+            for kind in AWARD_KINDS:
+                self._conn.execute(LEADERBOARD_SQL[kind], (chat_id, 10, 0)).fetchall()
+            self._loaded.add(chat_id)
+
+    def _ensure_lobby(self, chat_id: str):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO lobby (chat_id) VALUES (?)", (chat_id,)
+        )
+
+    def _log_event(self, chat_id: str, event: Dict[str, Any]):
+        event.setdefault("ts", int(time.time()))
+        if event["type"] != "player":
+            self._add_to_buckets(chat_id, event)
+        self._conn.execute(
+            "INSERT INTO events (chat_id, ts, type, user_id, username) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                chat_id,
+                event["ts"],
+                event["type"],
+                event.get("user_id"),
+                event.get("username"),
+            ),
+        )
+
+    def _add_to_buckets(self, chat_id: str, event: Dict[str, Any]):
+        kind = event["type"]
+        for unit in UNIT_SECONDS:
+            number = bucket_of(event["ts"], unit)
+            if kind in AWARD_KINDS:
+                self._conn.execute(
+                    AWARD_BUCKET_SQL[kind], (chat_id, unit, number, event["user_id"])
+                )
+            else:
+                column = "wins" if kind == "win" else "losses"
+                self._conn.execute(LOBBY_BUCKET_SQL[column], (chat_id, unit, number))
+            if self._pruned.get((chat_id, unit), -1) < number:
+                # Новая корзина: удаляем вышедшие за срок хранения
+                self._pruned[(chat_id, unit)] = number
+                for table in ("lobby_buckets", "player_buckets"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} "
+                        "WHERE chat_id = ? AND unit = ? AND bucket <= ?",
+                        (chat_id, unit, number - RETENTION[unit]),
+                    )
+
+    def _rebuild_buckets(self, chat_id: str):
+        """Пересчитывает корзины чата по таблице событий за срок хранения"""
+        for table in ("lobby_buckets", "player_buckets"):
+            self._conn.execute(f"DELETE FROM {table} WHERE chat_id = ?", (chat_id,))
+        since = time.time() - max(
+            RETENTION[unit] * seconds for unit, seconds in UNIT_SECONDS.items()
+        )
+        rows = self._conn.execute(
+            "SELECT ts, type, user_id FROM events WHERE chat_id = ? AND ts >= ? "
+            "AND type IN ('win', 'loss', 'mvp', 'lvp') ORDER BY id",
+            (chat_id, since),
+        ).fetchall()
+        for ts, kind, user_id in rows:
+            self._add_to_buckets(chat_id, {"ts": ts, "type": kind, "user_id": user_id})
+
+    def _new_player_id(self, chat_id: str) -> str:
+        self._ensure_lobby(chat_id)
+        (num,) = self._conn.execute(
+            "SELECT next_player_num FROM lobby WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        while self._conn.execute(
+            "SELECT 1 FROM players WHERE chat_id = ? AND user_id = ?",
+            (chat_id, f"user_{num}"),
+        ).fetchone():
+            num += 1
+        self._conn.execute(
+            "UPDATE lobby SET next_player_num = ? WHERE chat_id = ?",
+            (num + 1, chat_id),
+        )
+        return f"user_{num}"
+
+    def _insert_player(
+        self, chat_id: str, user_id: str, username: str, first_seen: str = None
+    ):
+        self._conn.execute(
+            "INSERT INTO players (chat_id, user_id, username, username_key, first_seen) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                chat_id,
+                user_id,
+                username,
+                normalize_username(username or ""),
+                first_seen or datetime.now().isoformat(),
+            ),
+        )
+
+    def record_game_result(self, chat_id: str, is_win: bool):
+        chat_id = str(chat_id)
+        column = "wins" if is_win else "losses"
+        self.load_chat(chat_id)
+        with self._lock:
+            self._ensure_lobby(chat_id)
+            self._conn.execute(
+                f"UPDATE lobby SET total_games = total_games + 1, "
+                f"{column} = {column} + 1 WHERE chat_id = ?",
+                (chat_id,),
+            )
+            self._log_event(chat_id, {"type": "win" if is_win else "loss"})
+        self._changed()
+
+    def add_award(self, chat_id: str, kind: str, username: str):
+        chat_id = str(chat_id)
+        self.load_chat(chat_id)
+        with self._lock:
+            user_id = self.find_player_by_username(chat_id, username)
+            if not user_id:
+                user_id = self._new_player_id(chat_id)
+                self._insert_player(chat_id, user_id, username)
+            self._conn.execute(AWARD_SQL[kind], (chat_id, user_id))
+            self._log_event(
+                chat_id, {"type": kind, "user_id": user_id, "username": username}
+            )
+        self._changed()
+
+    def register_player(
+        self, chat_id: str, user_id: str, username: str
+    ) -> Dict[str, Any]:
+        chat_id = str(chat_id)
+        self.load_chat(chat_id)
+        with self._lock:
+            player = self.get_player(chat_id, user_id)
+            if player is None:
+                self._insert_player(chat_id, user_id, username)
+            elif username and player["username"] != username:
+                self._conn.execute(
+                    "UPDATE players SET username = ?, username_key = ? "
+                    "WHERE chat_id = ? AND user_id = ?",
+                    (username, normalize_username(username), chat_id, user_id),
+                )
+            else:
+                return player
+            self._log_event(
+                chat_id, {"type": "player", "user_id": user_id, "username": username}
+            )
+            player = self.get_player(chat_id, user_id)
+        self._changed()
+        return player
+
+    def find_player_by_username(self, chat_id: str, username: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id FROM players WHERE chat_id = ? AND username_key = ? "
+                "ORDER BY rowid LIMIT 1",
+                (str(chat_id), normalize_username(username)),
+            ).fetchone()
+        return row["user_id"] if row else None
+
+    def get_player(self, chat_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mvp_count, lvp_count, username, first_seen FROM players "
+                "WHERE chat_id = ? AND user_id = ?",
+                (str(chat_id), user_id),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def get_lobby_stats(self, chat_id: str) -> Dict[str, int]:
+        self.load_chat(chat_id)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total_games, wins, losses FROM lobby WHERE chat_id = ?",
+                (str(chat_id),),
+            ).fetchone()
+        return dict(row) if row else {"total_games": 0, "wins": 0, "losses": 0}
+
+    def get_leaderboard(
+        self, chat_id: str, kind: str, offset: int = 0, limit: int = 10
+    ) -> List[Tuple[str, int]]:
+        self.load_chat(chat_id)
+        with self._lock:
+            rows = self._conn.execute(
+                LEADERBOARD_SQL[kind], (str(chat_id), limit, offset)
+            ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def get_window_stats(
+        self, chat_id: str, unit: str, count: int, limit: int = 10
+    ) -> Dict[str, Any]:
+        chat_id = str(chat_id)
+        since = bucket_of(time.time(), unit) - count
+        self.load_chat(chat_id)
+        with self._lock:
+            wins, losses = self._conn.execute(
+                "SELECT COALESCE(SUM(wins), 0), COALESCE(SUM(losses), 0) "
+                "FROM lobby_buckets WHERE chat_id = ? AND unit = ? AND bucket > ?",
+                (chat_id, unit, since),
+            ).fetchone()
+            result = {"total_games": wins + losses, "wins": wins, "losses": losses}
+            for kind in AWARD_KINDS:
+                rows = self._conn.execute(
+                    WINDOW_TOP_SQL[kind], (chat_id, unit, since, limit)
+                ).fetchall()
+                result[kind] = [(row[0], row[1]) for row in rows]
+        return result
+
+    def import_chat(self, chat_id: str, data: Dict[str, Any]):
+        """Импортирует счётчики чата из JSON-снапшота одной транзакцией"""
+        chat_id = str(chat_id)
+        lobby = data.get("lobby_stats", {})
+        players = data.get("player_stats", {})
+        with self._lock:
+            self._conn.commit()
+            with self._conn:
+                self._conn.execute("DELETE FROM players WHERE chat_id = ?", (chat_id,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO lobby "
+                    "(chat_id, total_games, wins, losses, next_player_num) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        chat_id,
+                        lobby.get("total_games", 0),
+                        lobby.get("wins", 0),
+                        lobby.get("losses", 0),
+                        data.get("next_player_num", 1),
+                    ),
+                )
+                self._conn.executemany(
+                    INSERT_PLAYER_SQL,
+                    (
+                        _player_row(chat_id, user_id, player)
+                        for user_id, player in players.items()
+                    ),
+                )
+                if "windows" in data:
+                    self._import_windows(chat_id, data["windows"])
+
+    def _import_windows(self, chat_id: str, windows: Dict[str, Any]):
+        # Корзины берутся из снапшота: журнал после ротации хранит только
+        # события с последнего снапшота
+        for table in ("lobby_buckets", "player_buckets"):
+            self._conn.execute(f"DELETE FROM {table} WHERE chat_id = ?", (chat_id,))
+        for unit, buckets in windows.items():
+            for number, bucket in buckets.items():
+                self._conn.execute(
+                    "INSERT INTO lobby_buckets (chat_id, unit, bucket, wins, losses) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (chat_id, unit, int(number), bucket["wins"], bucket["losses"]),
+                )
+                user_ids = set(bucket["mvp"]) | set(bucket["lvp"])
+                self._conn.executemany(
+                    "INSERT INTO player_buckets (chat_id, unit, bucket, user_id, "
+                    "mvp_count, lvp_count) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        (
+                            chat_id,
+                            unit,
+                            int(number),
+                            user_id,
+                            bucket["mvp"].get(user_id, 0),
+                            bucket["lvp"].get(user_id, 0),
+                        )
+                        for user_id in user_ids
+                    ),
+                )
+
+    def iter_players(
+        self, chat_id: str, chunk_size: int = 1000
+    ) -> Iterator[List[Dict[str, Any]]]:
+        chat_id = str(chat_id)
+        last_user_id = ""
+        while True:
+            # Постранично по первичному ключу: без OFFSET и без общей выборки
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT user_id, mvp_count, lvp_count, username, first_seen "
+                    "FROM players WHERE chat_id = ? AND user_id > ? "
+                    "ORDER BY user_id LIMIT ?",
+                    (chat_id, last_user_id, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            yield [dict(row) for row in rows]
+            last_user_id = rows[-1]["user_id"]
+
+    def import_players(
+        self,
+        chat_id: str,
+        batches: Iterable[List[Dict[str, Any]]],
+        lobby_stats: Optional[Dict[str, int]] = None,
+    ) -> int:
+        chat_id = str(chat_id)
+        # Файл читается и проверяется без блокировки, во временную базу:
+        # статистика остальных чатов в это время доступна
+        fd, staging_path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        try:
+            count = _stage_players(staging_path, chat_id, batches)
+            with self._lock:
+                self._conn.commit()
+                self._conn.execute("ATTACH DATABASE ? AS staging", (staging_path,))
+                try:
+                    # Замена одной транзакцией, уже без разбора файла
+                    with self._conn:
+                        # История и корзины за периоды ссылаются на прежних
+                        # игроков: начинаются заново
+                        for table in (
+                            "players",
+                            "events",
+                            "lobby_buckets",
+                            "player_buckets",
+                        ):
+                            self._conn.execute(
+                                f"DELETE FROM {table} WHERE chat_id = ?", (chat_id,)
+                            )
+                        self._conn.execute(
+                            f"INSERT INTO players ({PLAYER_COLUMNS}) "
+                            f"SELECT {PLAYER_COLUMNS} FROM staging.players"
+                        )
+                        self._ensure_lobby(chat_id)
+                        if lobby_stats is not None:
+                            self._conn.execute(
+                                "UPDATE lobby SET total_games = ?, wins = ?, "
+                                "losses = ? WHERE chat_id = ?",
+                                (
+                                    lobby_stats.get("total_games", 0),
+                                    lobby_stats.get("wins", 0),
+                                    lobby_stats.get("losses", 0),
+                                    chat_id,
+                                ),
+                            )
+                finally:
+                    self._conn.execute("DETACH DATABASE staging")
+        finally:
+            os.remove(staging_path)
+        return count
+
+    def import_events(self, chat_id: str, events, rebuild_buckets: bool = True):
+        """Переносит историю событий из журнала чата.
+
+        rebuild_buckets=False — корзины уже перенесены из снапшота import_chat.
+        """
+        with self._lock:
+            self._conn.commit()
+            with self._conn:
+                self._conn.execute("DELETE FROM events WHERE chat_id = ?", (chat_id,))
+                self._conn.executemany(
+                    "INSERT INTO events (chat_id, ts, type, user_id, username) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (
+                            chat_id,
+                            event["ts"],
+                            event["type"],
+                            event.get("user_id"),
+                            event.get("username"),
+                        )
+                        for event in events
+                    ),
+                )
+                if rebuild_buckets:
+                    self._rebuild_buckets(chat_id)
+
+    def flush(self):
+        self._writer.flush(force=True)
+
+    def close(self):
+        self._writer.close()
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+
+def main():
+    """Перенос статистики из JSON в SQLite"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--db", default=STATS_DB_FILE, help="файл базы SQLite")
+    parser.add_argument(
+        "--legacy-file",
+        help="старый общий group_stats.json (нужен вместе с --chat-id)",
+    )
+    parser.add_argument("--chat-id", help="чат, в который переносится --legacy-file")
+    args = parser.parse_args()
+
+    from stats_json import STATS_DIR, ChatStats
+
+    backend = SqliteStatsBackend(args.db)
+    if args.legacy_file:
+        if not args.chat_id:
+            parser.error("--legacy-file требует --chat-id")
+        with open(args.legacy_file, "r", encoding="utf-8") as f:
+            backend.import_chat(args.chat_id, json.load(f))
+        print(f"Чат {args.chat_id}: импортирован {args.legacy_file}")
+
+    chat_ids = set()
+    if os.path.isdir(STATS_DIR):
+        for name in os.listdir(STATS_DIR):
+            for suffix in (".events.log", ".snap", ".json"):
+                if name.endswith(suffix):
+                    chat_ids.add(name[: -len(suffix)])
+                    break
+    for chat_id in sorted(chat_ids):
+        shard = ChatStats(chat_id)
+        shard.load()
+        backend.import_chat(chat_id, shard.snapshot())
+        backend.import_events(
+            chat_id, read_journal(shard.events_file), rebuild_buckets=False
+        )
+        shard.journal.close()
+        print(f"Чат {chat_id}: {len(shard.player_stats)} игроков")
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+# Сколько часовых и дневных корзин хранить; старше — удаляются
+WINDOW_HOURS = int(os.getenv("STATS_WINDOW_HOURS", "48"))
+WINDOW_DAYS = int(os.getenv("STATS_WINDOW_DAYS", "90"))
+
+UNIT_SECONDS = {"h": 3600, "d": 86400}
+RETENTION = {"h": WINDOW_HOURS, "d": WINDOW_DAYS}
+
+_WINDOW_RE = re.compile(r"^(\d+)\s*([hdчд])$")
+_UNIT_ALIASES = {"h": "h", "ч": "h", "d": "d", "д": "d"}
+
+
+def parse_window(text: str) -> Optional[Tuple[str, int]]:
+    """«7d», «24h», «30д» → ("d", 7) и т.п.; None, если окно не поддерживается"""
+    match = _WINDOW_RE.match(text.strip().lower())
+    if not match:
+        return None
+    unit = _UNIT_ALIASES[match.group(2)]
+    count = int(match.group(1))
+    if not 1 <= count <= RETENTION[unit]:
+        return None
+    return unit, count
+
+
+def window_label(unit: str, count: int) -> str:
+    return f"{count} ч" if unit == "h" else f"{count} дн."
+
+
+def bucket_of(ts: float, unit: str) -> int:
+    """Номер корзины: часы или сутки (UTC) от начала эпохи"""
+    return int(ts // UNIT_SECONDS[unit])
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {"wins": 0, "losses": 0, "mvp": {}, "lvp": {}}
+
+
+class WindowedCounters:
+    """Счётчики игр и наград по часовым и дневным корзинам.
+
+    Каждое событие увеличивает одну часовую и одну дневную корзину, поэтому
+    запрос за окно складывает не больше STATS_WINDOW_HOURS или
+    STATS_WINDOW_DAYS корзин и не зависит от длины истории. Корзины старше
+    срока хранения удаляются при появлении новой.
+    """
+
+    def __init__(self):
+        # {единица: {номер корзины: {wins, losses, mvp: {user_id: n}, lvp: {...}}}}
+        self.buckets = {unit: {} for unit in UNIT_SECONDS}
+
+    def add(self, ts: float, field: str, user_id: str = None):
+        for unit, buckets in self.buckets.items():
+            number = bucket_of(ts, unit)
+            bucket = buckets.get(number)
+            if bucket is None:
+                newest = max(buckets, default=number)
+                if number <= newest - RETENTION[unit]:
+                    # Событие старше срока хранения (доигрывание старого журнала)
+                    continue
+                bucket = buckets[number] = _new_bucket()
+                if number >= newest:
+                    self._prune(unit, number)
+            if user_id is None:
+                bucket[field] += 1
+            else:
+                bucket[field][user_id] = bucket[field].get(user_id, 0) + 1
+
+    def _prune(self, unit: str, newest: int):
+        buckets = self.buckets[unit]
+        for number in [n for n in buckets if n <= newest - RETENTION[unit]]:
+            del buckets[number]
+
+    def query(self, unit: str, count: int, now: float) -> Dict[str, Any]:
+        """Сумма последних count корзин, включая текущую"""
+        newest = bucket_of(now, unit)
+        result = {"wins": 0, "losses": 0, "mvp": Counter(), "lvp": Counter()}
+        buckets = self.buckets[unit]
+        for number in range(newest - count + 1, newest + 1):
+            bucket = buckets.get(number)
+            if bucket is None:
+                continue
+            result["wins"] += bucket["wins"]
+            result["losses"] += bucket["losses"]
+            result["mvp"].update(bucket["mvp"])
+            result["lvp"].update(bucket["lvp"])
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            unit: {
+                str(number): {
+                    "wins": bucket["wins"],
+                    "losses": bucket["losses"],
+                    "mvp": dict(bucket["mvp"]),
+                    "lvp": dict(bucket["lvp"]),
+                }
+                for number, bucket in buckets.items()
+            }
+            for unit, buckets in self.buckets.items()
+        }
+
+    def load_dict(self, data: Dict[str, Any]):
+        for unit in self.buckets:
+            self.buckets[unit] = {
+                int(number): bucket for number, bucket in data.get(unit, {}).items()
+            }
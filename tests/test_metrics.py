@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+import statistics_data
+
+
+def operation_count(operation: str) -> int:
+    histogram = metrics.registry.histograms.get(
+        ("bot_operation_duration_seconds", (("operation", operation),))
+    )
+    return histogram.count if histogram is not None else 0
+
+
+class StatsTimersTest(unittest.TestCase):
+    """load_stats и save_stats считаются на путях, по которым ходит бот"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._workdir = tempfile.TemporaryDirectory()
+        os.chdir(self._workdir.name)
+        self._enabled = metrics.METRICS_ENABLED
+        metrics.METRICS_ENABLED = True
+        metrics.registry.histograms.clear()
+
+    def tearDown(self):
+        statistics_data.close_stats()
+        statistics_data.STATS_BACKEND = os.getenv("STATS_BACKEND", "json")
+        metrics.METRICS_ENABLED = self._enabled
+        os.chdir(self._cwd)
+        self._workdir.cleanup()
+
+    def check_backend(self, backend: str):
+        statistics_data.STATS_BACKEND = backend
+
+        async def win():
+            # Как /win: запись в потоке статистики через run_stats
+            await statistics_data.run_stats(
+                statistics_data.record_game_result, -100, True
+            )
+
+        asyncio.run(win())
+        statistics_data.close_stats()
+
+        self.assertGreater(operation_count("load_stats"), 0)
+        self.assertGreater(operation_count("save_stats"), 0)
+
+    def test_json(self):
+        self.check_backend("json")
+
+    def test_sqlite(self):
+        self.check_backend("sqlite")
+
+
+if __name__ == "__main__":
+    unittest.main()
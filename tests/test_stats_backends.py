@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_json import JsonStatsBackend
+from stats_sqlite import SqliteStatsBackend
+
+CHAT_ID = "-100"
+OTHER_CHAT_ID = "-200"
+
+
+def play(backend):
+    """Одинаковая последовательность команд для обоих хранилищ"""
+    backend.register_player(CHAT_ID, "111", "Alice")
+    backend.register_player(CHAT_ID, "222", "bob")
+    for is_win in (True, True, False):
+        backend.record_game_result(CHAT_ID, is_win)
+    for kind, username in (
+        ("mvp", "alice"),
+        ("mvp", "@ALICE"),
+        ("mvp", "bob"),
+        ("lvp", "bob"),
+        # Игрок, которого ещё нет: создаётся по нику
+        ("mvp", "carol"),
+        ("lvp", "carol"),
+    ):
+        backend.add_award(CHAT_ID, kind, username)
+    # Смена ника не создаёт нового игрока
+    backend.register_player(CHAT_ID, "222", "bobby")
+    backend.record_game_result(OTHER_CHAT_ID, False)
+
+
+def observe(backend):
+    """Всё, что бот читает из хранилища"""
+    players = [
+        {key: value for key, value in player.items() if key != "first_seen"}
+        for chunk in backend.iter_players(CHAT_ID, chunk_size=2)
+        for player in chunk
+    ]
+    return {
+        "lobby": backend.get_lobby_stats(CHAT_ID),
+        "other_lobby": backend.get_lobby_stats(OTHER_CHAT_ID),
+        "mvp": backend.get_leaderboard(CHAT_ID, "mvp"),
+        "lvp": backend.get_leaderboard(CHAT_ID, "lvp"),
+        "mvp_page": backend.get_leaderboard(CHAT_ID, "mvp", offset=1, limit=1),
+        "by_username": [
+            backend.find_player_by_username(CHAT_ID, name)
+            for name in ("ALICE", "@bobby", "bob", "nobody")
+        ],
+        "players": sorted(players, key=lambda player: player["user_id"]),
+        "window_24h": backend.get_window_stats(CHAT_ID, "h", 24),
+        "window_7d": backend.get_window_stats(CHAT_ID, "d", 7),
+    }
+
+
+class BackendParityTest(unittest.TestCase):
+    """SQLite отвечает так же, как JSON, и до, и после перезапуска"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._workdir = tempfile.TemporaryDirectory()
+        os.chdir(self._workdir.name)
+        self.db_path = os.path.join(self._workdir.name, "stats.db")
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._workdir.cleanup()
+
+    def test_same_answers(self):
+        json_backend = JsonStatsBackend()
+        sqlite_backend = SqliteStatsBackend(self.db_path)
+        play(json_backend)
+        play(sqlite_backend)
+
+        expected = observe(json_backend)
+        self.assertEqual(observe(sqlite_backend), expected)
+        self.assertEqual(expected["lobby"], {"total_games": 3, "wins": 2, "losses": 1})
+        self.assertEqual(expected["mvp"], [("Alice", 2), ("bobby", 1), ("carol", 1)])
+        self.assertEqual(expected["window_7d"]["mvp"], expected["mvp"])
+
+        json_backend.close()
+        sqlite_backend.close()
+        json_backend = JsonStatsBackend()
+        sqlite_backend = SqliteStatsBackend(self.db_path)
+        try:
+            self.assertEqual(observe(json_backend), expected)
+            self.assertEqual(observe(sqlite_backend), expected)
+        finally:
+            json_backend.close()
+            sqlite_backend.close()
+
+    def test_shared_database_commits_each_change(self):
+        backend = SqliteStatsBackend(self.db_path, shared=True)
+        other = SqliteStatsBackend(self.db_path, shared=True)
+        try:
+            backend.record_game_result(CHAT_ID, True)
+            backend.add_award(CHAT_ID, "mvp", "alice")
+            # Второй процесс видит изменения без flush и сам может писать
+            self.assertEqual(other.get_lobby_stats(CHAT_ID)["wins"], 1)
+            self.assertEqual(other.get_leaderboard(CHAT_ID, "mvp"), [("alice", 1)])
+            other.record_game_result(CHAT_ID, False)
+            self.assertEqual(backend.get_lobby_stats(CHAT_ID)["total_games"], 2)
+        finally:
+            backend.close()
+            other.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats_export
+from stats_json import JsonStatsBackend
+from stats_sqlite import SqliteStatsBackend
+
+CHAT_ID = "-100"
+SOURCE_CHAT_ID = "-200"
+
+
+def export_text(backend, chat_id: str, fmt: str) -> str:
+    return b"".join(stats_export.export_stats(backend, chat_id, fmt, 2)).decode()
+
+
+def import_text(backend, chat_id: str, text: str, fmt: str = "ndjson") -> int:
+    return stats_export.import_stats(backend, chat_id, io.StringIO(text), fmt, 2)
+
+
+class ValidatePlayerTest(unittest.TestCase):
+    def test_normalized(self):
+        player = stats_export.validate_player(
+            {"user_id": 42, "username": "", "mvp_count": "3", "first_seen": "100"}, 1
+        )
+        self.assertEqual(
+            player,
+            {
+                "user_id": "42",
+                "username": None,
+                "mvp_count": 3,
+                "lvp_count": 0,
+                "first_seen": 100,
+            },
+        )
+        player = stats_export.validate_player(
+            {"user_id": "a", "first_seen": "2024-01-02T03:04:05"}, 1
+        )
+        self.assertEqual(player["first_seen"], "2024-01-02T03:04:05")
+
+    def test_rejected_with_line_number(self):
+        for record in (
+            [],
+            {"username": "alice"},
+            {"user_id": True},
+            {"user_id": "1", "mvp_count": -1},
+            {"user_id": "1", "lvp_count": 1.5},
+            {"user_id": "1", "username": 5},
+            {"user_id": "1", "first_seen": "вчера"},
+        ):
+            with self.subTest(record=record):
+                with self.assertRaisesRegex(ValueError, "^Строка 7: "):
+                    stats_export.validate_player(record, 7)
+
+    def test_read_export(self):
+        lobby, players = stats_export.read_export(
+            io.StringIO(
+                '{"version":1,"lobby_stats":{"total_games":2,"wins":1}}\n'
+                "\n"
+                '{"user_id":"1","username":"a"}\n'
+            )
+        )
+        self.assertEqual(lobby, {"total_games": 2, "wins": 1, "losses": 0})
+        self.assertEqual([player["user_id"] for player in players], ["1"])
+
+        with self.assertRaisesRegex(ValueError, "версии 2"):
+            stats_export.read_export(io.StringIO('{"version":2,"lobby_stats":{}}\n'))
+        _, players = stats_export.read_export(io.StringIO("username\nalice\n"), "csv")
+        with self.assertRaisesRegex(ValueError, "нет user_id"):
+            list(players)
+        _, players = stats_export.read_export(io.StringIO('{"user_id":"1"}\n{oops\n'))
+        with self.assertRaisesRegex(ValueError, "^Строка 2: некорректный JSON"):
+            list(players)
+
+
+class ExportImportTest(unittest.TestCase):
+    """Загрузка в обоих хранилищах: всё или ничего"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._workdir = tempfile.TemporaryDirectory()
+        os.chdir(self._workdir.name)
+        self._backends = []
+
+    def tearDown(self):
+        for backend in self._backends:
+            backend.close()
+        os.chdir(self._cwd)
+        self._workdir.cleanup()
+
+    def for_each_backend(self, scenario):
+        json_backend = JsonStatsBackend()
+        sqlite_backend = SqliteStatsBackend(
+            os.path.join(self._workdir.name, "stats.db")
+        )
+        self._backends += [json_backend, sqlite_backend]
+        for backend in (json_backend, sqlite_backend):
+            with self.subTest(backend=type(backend).__name__):
+                for _ in range(3):
+                    backend.add_award(CHAT_ID, "mvp", "alice")
+                backend.record_game_result(CHAT_ID, True)
+                backend.register_player(SOURCE_CHAT_ID, "user_1", "bob")
+                backend.add_award(SOURCE_CHAT_ID, "mvp", "bob")
+                for name in ("carol", "dave", "erin"):
+                    backend.add_award(SOURCE_CHAT_ID, "lvp", name)
+                backend.record_game_result(SOURCE_CHAT_ID, False)
+                scenario(backend)
+
+    def assert_unchanged(self, backend):
+        self.assertEqual(backend.get_leaderboard(CHAT_ID, "mvp"), [("alice", 3)])
+        self.assertEqual(backend.get_lobby_stats(CHAT_ID)["wins"], 1)
+        self.assertEqual(
+            backend.get_window_stats(CHAT_ID, "d", 7)["mvp"], [("alice", 3)]
+        )
+
+    def test_round_trip(self):
+        def scenario(backend):
+            for fmt in stats_export.EXPORT_FORMATS:
+                exported = export_text(backend, SOURCE_CHAT_ID, fmt)
+                self.assertEqual(import_text(backend, CHAT_ID, exported, fmt), 4)
+                self.assertEqual(
+                    list(backend.iter_players(CHAT_ID)),
+                    list(backend.iter_players(SOURCE_CHAT_ID)),
+                )
+                self.assertEqual(
+                    backend.get_leaderboard(CHAT_ID, "lvp"),
+                    backend.get_leaderboard(SOURCE_CHAT_ID, "lvp"),
+                )
+            # Счётчики лобби переносит только NDJSON
+            exported = export_text(backend, SOURCE_CHAT_ID, "ndjson")
+            import_text(backend, CHAT_ID, exported)
+            self.assertEqual(
+                backend.get_lobby_stats(CHAT_ID),
+                backend.get_lobby_stats(SOURCE_CHAT_ID),
+            )
+
+        self.for_each_backend(scenario)
+
+    def test_duplicate_user_id_leaves_chat_unchanged(self):
+        text = (
+            '{"user_id":"1","username":"x"}\n'
+            '{"user_id":"2","username":"y"}\n'
+            '{"user_id":"3","username":"z"}\n'
+            '{"user_id":"1","username":"w"}\n'
+        )
+
+        def scenario(backend):
+            with self.assertRaisesRegex(ValueError, "Повторяется user_id"):
+                import_text(backend, CHAT_ID, text)
+            self.assert_unchanged(backend)
+
+        self.for_each_backend(scenario)
+
+    def test_invalid_row_leaves_chat_unchanged(self):
+        text = (
+            '{"version":1,"lobby_stats":{"total_games":0}}\n'
+            '{"user_id":"1","username":"x"}\n'
+            '{"user_id":"2","username":"y"}\n'
+            '{"user_id":"3","mvp_count":-5}\n'
+        )
+
+        def scenario(backend):
+            with self.assertRaisesRegex(ValueError, "^Строка 4: "):
+                import_text(backend, CHAT_ID, text)
+            self.assert_unchanged(backend)
+
+        self.for_each_backend(scenario)
+
+    def test_import_resets_window_stats(self):
+        def scenario(backend):
+            exported = export_text(backend, SOURCE_CHAT_ID, "ndjson")
+            import_text(backend, CHAT_ID, exported)
+
+            # Награды alice не переходят игроку, получившему её user_id
+            self.assertEqual(backend.get_leaderboard(CHAT_ID, "mvp"), [("bob", 1)])
+            window = backend.get_window_stats(CHAT_ID, "d", 7)
+            self.assertEqual((window["mvp"], window["total_games"]), ([], 0))
+            backend.add_award(CHAT_ID, "mvp", "bob")
+            self.assertEqual(
+                backend.get_window_stats(CHAT_ID, "d", 7)["mvp"], [("bob", 1)]
+            )
+
+        self.for_each_backend(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stats_json
+from stats_persistence import EventJournal, read_journal
+
+CHAT_ID = "-100"
+
+
+def crash(backend: stats_json.JsonStatsBackend):
+    """Как падение процесса: журналы сброшены на диск, снапшоты не записаны"""
+    if backend._writer is not None:
+        backend._writer.close()
+        backend._writer = None
+    with backend._lock:
+        for chat_id in list(backend._shards):
+            backend._evict(chat_id)
+
+
+class ReadJournalTest(unittest.TestCase):
+    def setUp(self):
+        self._workdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._workdir.name, "events.log")
+
+    def tearDown(self):
+        self._workdir.cleanup()
+
+    def test_torn_tail_is_dropped_and_truncated(self):
+        journal = EventJournal(self.path)
+        journal.append({"type": "win", "ts": 1})
+        journal.append({"type": "loss", "ts": 2})
+        journal.close()
+        good_size = os.path.getsize(self.path)
+        with open(self.path, "ab") as f:
+            f.write(b'{"type":"win","ts":')
+
+        events = list(read_journal(self.path))
+
+        self.assertEqual([event["type"] for event in events], ["win", "loss"])
+        self.assertEqual(os.path.getsize(self.path), good_size)
+
+    def test_offset_skips_applied_events(self):
+        journal = EventJournal(self.path)
+        journal.append({"type": "win", "ts": 1})
+        offset = journal.append({"type": "loss", "ts": 2})
+        journal.append({"type": "win", "ts": 3})
+        journal.close()
+
+
+        events = list(read_journal(self.path, offset))
+
+        self.assertEqual([event["ts"] for event in events], [3])
+
+
+class JsonRecoveryTest(unittest.TestCase):
+    """Счётчики переживают падение на любом шаге записи снапшота"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._workdir = tempfile.TemporaryDirectory()
+        os.chdir(self._workdir.name)
+        self._backends = []
+
+    def tearDown(self):
+        for backend in self._backends:
+            crash(backend)
+        os.chdir(self._cwd)
+        self._workdir.cleanup()
+
+    def new_backend(self) -> stats_json.JsonStatsBackend:
+        backend = stats_json.JsonStatsBackend()
+        self._backends.append(backend)
+        return backend
+
+    def play(self, backend, wins: int, mvps: int):
+        for _ in range(wins):
+            backend.record_game_result(CHAT_ID, True)
+        for _ in range(mvps):
+            backend.add_award(CHAT_ID, "mvp", "alice")
+
+    def assert_counts(self, wins: int, mvps: int):
+        backend = self.new_backend()
+        self.assertEqual(
+            backend.get_lobby_stats(CHAT_ID),
+            {"total_games": wins, "wins": wins, "losses": 0},
+        )
+        self.assertEqual(backend.get_leaderboard(CHAT_ID, "mvp"), [("alice", mvps)])
+        self.assertEqual(backend.get_window_stats(CHAT_ID, "d", 1)["wins"], wins)
+        return backend
+
+    def for_each_format(self, scenario):
+        for snapshot_format in ("binary", "json"):
+            with self.subTest(format=snapshot_format), mock.patch.object(
+                stats_json, "SNAPSHOT_FORMAT", snapshot_format
+            ):
+                scenario()
+            for backend in self._backends:
+                crash(backend)
+            self._backends = []
+            for name in os.listdir(stats_json.STATS_DIR):
+                os.remove(os.path.join(stats_json.STATS_DIR, name))
+
+    def test_journal_replayed_without_snapshot(self):
+        backend = self.new_backend()
+        self.play(backend, wins=3, mvps=2)
+        crash(backend)
+
+        snapshot_file = os.path.join(stats_json.STATS_DIR, f"{CHAT_ID}.snap")
+        self.assertFalse(os.path.exists(snapshot_file))
+        self.assert_counts(wins=3, mvps=2)
+
+    def test_torn_tail_after_crash(self):
+        backend = self.new_backend()
+        self.play(backend, wins=2, mvps=1)
+        crash(backend)
+        events_file = os.path.join(stats_json.STATS_DIR, f"{CHAT_ID}.events.log")
+        with open(events_file, "ab") as f:
+            f.write(b'{"type":"win"')
+
+        backend = self.assert_counts(wins=2, mvps=1)
+        # Новые события пишутся с чистой строки и тоже доигрываются
+        self.play(backend, wins=1, mvps=0)
+        crash(backend)
+        self.assert_counts(wins=3, mvps=1)
+
+    def test_crash_after_rotation(self):
+        def scenario():
+            backend = self.new_backend()
+            self.play(backend, wins=2, mvps=1)
+            backend.compact()
+            self.play(backend, wins=1, mvps=1)
+            with backend._snapshot_write_lock, backend._lock:
+                # Журнал сменился, а новый снапшот записать не успели
+                backend.load_chat(CHAT_ID).rotate_journal()
+            self.play(backend, wins=1, mvps=1)
+            crash(backend)
+
+            backend = self.assert_counts(wins=4, mvps=3)
+            # Следующий снапшот поглощает архив
+            backend.compact()
+            self.assertFalse(os.path.exists(backend.load_chat(CHAT_ID).archive_file))
+            crash(backend)
+            self.assert_counts(wins=4, mvps=3)
+
+        self.for_each_format(scenario)
+
+    def test_crash_before_archive_removed(self):
+        def scenario():
+            backend = self.new_backend()
+            self.play(backend, wins=2, mvps=1)
+            shard = backend.load_chat(CHAT_ID)
+            with backend._snapshot_write_lock, backend._lock:
+                path, data = backend._start_snapshot(shard)
+            shard.journal.sync()
+            shard.write_snapshot(path, data)
+            # Снапшот записан, архив журнала остался
+            self.assertTrue(os.path.exists(shard.archive_file))
+            self.play(backend, wins=1, mvps=1)
+            crash(backend)
+
+            backend = self.assert_counts(wins=3, mvps=2)
+            # Устаревший архив удаляется при загрузке, а не доигрывается
+            self.assertFalse(os.path.exists(backend.load_chat(CHAT_ID).archive_file))
+
+        self.for_each_format(scenario)
+
+    def test_compaction_keeps_counts(self):
+        def scenario():
+            backend = self.new_backend()
+            self.play(backend, wins=2, mvps=2)
+            backend.compact()
+            self.play(backend, wins=1, mvps=0)
+            backend.compact()
+            crash(backend)
+
+            self.assert_counts(wins=3, mvps=2)
+
+        self.for_each_format(scenario)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats_windows import RETENTION, WindowedCounters, bucket_of, parse_window
+
+HOUR = 3600
+DAY = 86400
+# Начало суток UTC, чтобы часы и сутки легко считать
+NOW = 20000 * DAY
+
+
+class ParseWindowTest(unittest.TestCase):
+    def test_units_and_aliases(self):
+        self.assertEqual(parse_window("7d"), ("d", 7))
+        self.assertEqual(parse_window("24h"), ("h", 24))
+        self.assertEqual(parse_window(" 30Д "), ("d", 30))
+        self.assertEqual(parse_window("12ч"), ("h", 12))
+        self.assertEqual(parse_window("3 d"), ("d", 3))
+
+    def test_rejected(self):
+        for text in ("", "d", "7", "7w", "-1d", "1.5h", "0d", "7dd"):
+            with self.subTest(text=text):
+                self.assertIsNone(parse_window(text))
+
+    def test_retention_limits(self):
+        self.assertEqual(parse_window(f"{RETENTION['h']}h"), ("h", RETENTION["h"]))
+        self.assertIsNone(parse_window(f"{RETENTION['h'] + 1}h"))
+        self.assertEqual(parse_window(f"{RETENTION['d']}d"), ("d", RETENTION["d"]))
+        self.assertIsNone(parse_window(f"{RETENTION['d'] + 1}d"))
+
+
+class BucketOfTest(unittest.TestCase):
+    def test_bucket_boundaries(self):
+        self.assertEqual(bucket_of(NOW, "h"), NOW // HOUR)
+        self.assertEqual(bucket_of(NOW + HOUR - 1, "h"), NOW // HOUR)
+        self.assertEqual(bucket_of(NOW + HOUR, "h"), NOW // HOUR + 1)
+        self.assertEqual(bucket_of(NOW - 1, "d"), NOW // DAY - 1)
+        self.assertEqual(bucket_of(NOW + DAY - 0.5, "d"), NOW // DAY)
+
+
+class WindowedCountersTest(unittest.TestCase):
+    def test_query_sums_last_buckets_including_current(self):
+        counters = WindowedCounters()
+        counters.add(NOW - 2 * HOUR, "wins")
+        counters.add(NOW - HOUR, "losses")
+        counters.add(NOW + 10, "wins")
+        counters.add(NOW + 20, "mvp", "alice")
+        counters.add(NOW - 2 * DAY, "mvp", "alice")
+        counters.add(NOW - 2 * DAY, "lvp", "bob")
+
+        last_hour = counters.query("h", 1, NOW + 30)
+        self.assertEqual((last_hour["wins"], last_hour["losses"]), (1, 0))
+        self.assertEqual(dict(last_hour["mvp"]), {"alice": 1})
+
+        last_3h = counters.query("h", 3, NOW + 30)
+        self.assertEqual((last_3h["wins"], last_3h["losses"]), (2, 1))
+
+        today = counters.query("d", 1, NOW + 30)
+        self.assertEqual((today["wins"], today["losses"]), (1, 0))
+        last_3d = counters.query("d", 3, NOW + 30)
+        self.assertEqual((last_3d["wins"], last_3d["losses"]), (2, 1))
+        self.assertEqual(dict(last_3d["mvp"]), {"alice": 2})
+        self.assertEqual(dict(last_3d["lvp"]), {"bob": 1})
+
+    def test_old_buckets_pruned(self):
+        counters = WindowedCounters()
+        counters.add(NOW, "wins")
+        counters.add(NOW + RETENTION["h"] * HOUR, "wins")
+
+        hours = counters.buckets["h"]
+        self.assertNotIn(bucket_of(NOW, "h"), hours)
+        self.assertEqual(len(hours), 1)
+        # Сутки ещё в сроке хранения
+        self.assertEqual(len(counters.buckets["d"]), 2)
+
+    def test_events_older_than_retention_ignored(self):
+        counters = WindowedCounters()
+        counters.add(NOW, "wins")
+        counters.add(NOW - RETENTION["h"] * HOUR, "losses")
+
+        self.assertEqual(list(counters.buckets["h"]), [bucket_of(NOW, "h")])
+        # В дневной корзине то же событие ещё хранится
+        self.assertEqual(counters.query("d", 3, NOW)["losses"], 1)
+
+    def test_dict_round_trip(self):
+        counters = WindowedCounters()
+        counters.add(NOW, "wins")
+        counters.add(NOW + 5, "mvp", "alice")
+        counters.add(NOW - DAY, "lvp", "bob")
+
+        restored = WindowedCounters()
+        restored.load_dict(counters.to_dict())
+
+        self.assertEqual(restored.buckets, counters.buckets)
+        self.assertEqual(restored.query("d", 7, NOW), counters.query("d", 7, NOW))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_scheduler import SynthesisScheduler
+
+
+class SchedulerCloseTest(unittest.IsolatedAsyncioTestCase):
+    """После close никто не ждёт озвучку вечно"""
+
+    async def test_close_cancels_pending_futures(self):
+        scheduler = SynthesisScheduler(workers=1, max_queue=5, max_per_user=5)
+
+        async def job():
+            await asyncio.sleep(100)
+
+        running, _ = scheduler.submit("a", 1, job)
+        queued, _ = scheduler.submit("b", 1, job)
+        coalesced, _ = scheduler.submit("a", 2, job)
+        self.assertIs(coalesced, running)
+        waiters = [
+            asyncio.ensure_future(asyncio.shield(future))
+            for future in (running, queued, coalesced)
+        ]
+        await asyncio.sleep(0.01)
+
+        await scheduler.close()
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*waiters, return_exceptions=True), 1
+        )
+        for result in results:
+            self.assertIsInstance(result, asyncio.CancelledError)
+        self.assertEqual(scheduler._inflight, {})
+        self.assertEqual(scheduler.stats()["busy"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
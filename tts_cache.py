@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from stats_persistence import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "temp/tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def cache_key(text: str, voice: str, rate: str) -> str:
+    return hashlib.sha256(f"{voice}\0{rate}\0{text}".encode("utf-8")).hexdigest()
+
+
+class TtsCache:
+    """Двухуровневый кэш озвучки.
+
+    1. file_id уже загруженного в Telegram голосового — повтор не требует
+       ни синтеза, ни загрузки.
+    2. mp3 на диске с ограничением по размеру и вытеснением по LRU —
+       повтор не требует синтеза.
+
+    Учёт ведётся в event loop, а чтение и запись файлов уходят в потоки.
+    """
+
+    def __init__(
+        self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.file_ids_path = os.path.join(directory, "file_ids.json")
+        os.makedirs(directory, exist_ok=True)
+
+        # {key: размер файла}, от давно использованных к свежим
+        self._files = OrderedDict()
+        self._total_bytes = 0
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith(".part"):
+                # Недописанный файл после падения
+                os.remove(path)
+            elif name.endswith(".mp3"):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[: -len(".mp3")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._files[key] = size
+            self._total_bytes += size
+
+        self._file_ids = {}  # {key: {"file_id": str, "size": int}}
+        if os.path.exists(self.file_ids_path):
+            try:
+                with open(self.file_ids_path, "r", encoding="utf-8") as f:
+                    self._file_ids = json.load(f)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки file_id озвучки: {e}")
+
+        self.file_id_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.upload_bytes_saved = 0
+        self.synthesis_bytes_saved = 0
+        self._file_ids_lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get_file_id(self, key: str) -> Optional[str]:
+        entry = self._file_ids.get(key)
+        if entry is None:
+            return None
+        self.file_id_hits += 1
+        self.upload_bytes_saved += entry.get("size", 0)
+        self.synthesis_bytes_saved += entry.get("size", 0)
+        return entry["file_id"]
+
+    def forget_file_id(self, key: str):
+        """Убирает file_id, который Telegram перестал принимать"""
+        entry = self._file_ids.pop(key, None)
+        if entry is not None:
+            # Попадание не состоялось — откатываем учтённую экономию
+            self.file_id_hits -= 1
+            self.upload_bytes_saved -= entry.get("size", 0)
+            self.synthesis_bytes_saved -= entry.get("size", 0)
+
+    def put_file_id(self, key: str, file_id: str, size: int):
+        self._file_ids[key] = {"file_id": file_id, "size": size}
+
+    async def save_file_ids(self):
+        await asyncio.to_thread(self._write_file_ids, dict(self._file_ids))
+
+    def _write_file_ids(self, data: Dict[str, Any]):
+        try:
+            with self._file_ids_lock:
+                atomic_write_json(self.file_ids_path, data)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения file_id озвучки: {e}")
+
+    async def read(self, key: str) -> Optional[bytes]:
+        """mp3 из дискового кэша или None"""
+        size = self._files.get(key)
+        if size is None:
+            self.misses += 1
+            return None
+        try:
+            data = await asyncio.to_thread(self._read_file, self.path(key))
+        except OSError:
+            self._forget_file(key)
+            self.misses += 1
+            return None
+        self._files.move_to_end(key)
+        self.disk_hits += 1
+        self.synthesis_bytes_saved += size
+        return data
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+
+    def _forget_file(self, key: str):
+        self._total_bytes -= self._files.pop(key, 0)
+
+    async def store(self, key: str, data: bytes):
+        """Сохраняет mp3 в дисковый кэш и вытесняет старые файлы"""
+        try:
+            await asyncio.to_thread(self._write_file, self.path(key), data)
+        except OSError as e:
+            logger.error(f"Ошибка записи в кэш озвучки: {e}")
+            return
+        self._forget_file(key)
+        self._files[key] = len(data)
+        self._total_bytes += len(data)
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._files) > 1:
+            old_key, old_size = self._files.popitem(last=False)
+            self._total_bytes -= old_size
+            evicted.append(self.path(old_key))
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        # Уникальный временный файл: параллельные записи не мешают друг другу
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.file_id_hits + self.disk_hits + self.misses
+        return {
+            "requests": requests,
+            "file_id_hits": self.file_id_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (
+                (self.file_id_hits + self.disk_hits) / requests if requests else 0.0
+            ),
+            "upload_bytes_saved": self.upload_bytes_saved,
+            "synthesis_bytes_saved": self.synthesis_bytes_saved,
+            "disk_bytes": self._total_bytes,
+            "disk_files": len(self._files),
+        }
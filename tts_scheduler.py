@@ -0,0 +1,121 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "20"))
+TTS_MAX_PER_USER = int(os.getenv("TTS_MAX_PER_USER", "2"))
+
+
+class SchedulerBusy(Exception):
+    """Задачу не приняли: очередь заполнена или у пользователя слишком много задач"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # "queue" или "user"
+
+
+class SynthesisScheduler:
+    """Очередь синтеза речи с ограниченным числом воркеров.
+
+    Одинаковые задачи, которые уже выполняются или ждут, объединяются и
+    получают общий результат. Если очередь заполнена, задача сразу
+    отклоняется, а не копится без предела.
+    """
+
+    def __init__(
+        self,
+        workers: int = TTS_WORKERS,
+        max_queue: int = TTS_MAX_QUEUE,
+        max_per_user: int = TTS_MAX_PER_USER,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+
+        self._queue = None
+        self._tasks = []
+        self._busy = 0
+        self._inflight = {}  # {ключ задачи: Future с результатом}
+        self._per_user = {}  # {user_id: число незавершённых задач}
+
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    def submit(
+        self, key: Hashable, user_id: Any, job: Callable[[], Awaitable[Any]]
+    ) -> Tuple[asyncio.Future, int]:
+        """Ставит задачу в очередь.
+
+        Возвращает Future с результатом и число задач перед ней.
+        Бросает SchedulerBusy, если задачу принять нельзя.
+        """
+        self._start()
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future, 0
+
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            self.rejected += 1
+            raise SchedulerBusy("user")
+        if self._queue.full():
+            self.rejected += 1
+            raise SchedulerBusy("queue")
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self._queue.put_nowait((key, user_id, job, future))
+        ahead = max(0, self._queue.qsize() + self._busy - self.workers)
+        return future, ahead
+
+    async def _worker(self):
+        while True:
+            key, user_id, job, future = await self._queue.get()
+            self._busy += 1
+            try:
+                result = await job()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._busy -= 1
+                self._inflight.pop(key, None)
+                self._per_user[user_id] -= 1
+                if not self._per_user[user_id]:
+                    del self._per_user[user_id]
+                self._queue.task_done()
+
+    async def close(self):
+        """Останавливает воркеры; задачи из очереди не выполняются,
+        их ожидающие получают отмену"""
+        # Воркер при отмене сам убирает свою задачу из _inflight
+        pending = list(self._inflight.values())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for future in pending:
+            future.cancel()
+        self._tasks = []
+        self._queue = None
+        self._inflight.clear()
+        self._per_user.clear()
+        self._busy = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "busy": self._busy,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }